@@ -0,0 +1,204 @@
+from math import erf, sqrt
+import numpy as np
+
+# Simulation of many bankrolls played round after round at once as numpy
+# arrays, to size a bankroll for a bet schedule. Every round's net result (per
+# unit bet) is drawn independently, either from the exact distribution of
+# modules.distributions or from a normal distribution with the analysis' EV and
+# V. Trajectories are simulated a chunk of trajectories and a block of rounds
+# at a time so memory stays bounded however long they are. The results are
+# compared with the closed form approximations below, which treat the bankroll
+# as a Brownian motion with the same drift and variance per round.
+
+def normal_cdf(x):
+  return 0.5*(1+erf(x/sqrt(2)))
+
+def N0(EV,V):
+  # The number of rounds after which the expected win equals one standard
+  # deviation of the result, sqrt(N*V) = N*EV
+  return V/EV**2
+
+def risk_of_ruin(EV,V,bankroll,n_rounds=None):
+  """
+  The probability of losing the bankroll, within n_rounds rounds or ever if
+  n_rounds is None, by the Brownian motion approximation.
+  """
+  if n_rounds is None:
+    return 1.0 if EV<=0 else float(np.exp(-2*EV*bankroll/V))
+  s = sqrt(V*n_rounds)
+  return float(normal_cdf((-bankroll-EV*n_rounds)/s)+
+               np.exp(-2*EV*bankroll/V)*normal_cdf((-bankroll+EV*n_rounds)/s))
+
+def double_before_ruin(EV,V,bankroll):
+  # The probability of doubling the bankroll before losing it, by the
+  # Brownian motion approximation
+  if EV==0:
+    return 0.5
+  a = 2*EV*bankroll/V
+  return float(-np.expm1(-a)/-np.expm1(-2*a))
+
+class BankrollStats:
+  """
+  The outcome of every simulated trajectory. Rounds are counted from 1, and
+  are 0 if the event never happened within the simulated rounds.
+
+  Attributes:
+      ruin_round (np.ndarray): The round the bankroll was lost.
+      double_round (np.ndarray): The round the bankroll first doubled.
+      max_drawdown (np.ndarray): The largest fall from a peak, in units.
+      final (np.ndarray): The bankroll after the last round (or at ruin).
+  """
+  def __init__(self,bankroll,n_rounds,ruin_round,double_round,max_drawdown,final):
+    self.bankroll = bankroll
+    self.n_rounds = n_rounds
+    self.ruin_round = ruin_round
+    self.double_round = double_round
+    self.max_drawdown = max_drawdown
+    self.final = final
+
+  def merge(self,other):
+    return BankrollStats(self.bankroll,self.n_rounds,
+                         *[np.concatenate([getattr(self,k),getattr(other,k)])
+                           for k in ['ruin_round','double_round','max_drawdown','final']])
+
+  @property
+  def n(self):
+    return len(self.final)
+
+  @property
+  def risk_of_ruin(self):
+    return float(np.mean(self.ruin_round>0))
+
+  def risk_of_ruin_by(self,rounds):
+    # The fraction of trajectories ruined within each number of rounds
+    rounds = np.asarray(rounds)
+    ruined = self.ruin_round[self.ruin_round>0]
+    return np.searchsorted(np.sort(ruined),rounds,side='right')/self.n
+
+  def double_quantiles(self,q=(0.1,0.25,0.5,0.75,0.9)):
+    # Quantiles of the round the bankroll doubled, over the trajectories that did
+    doubled = self.double_round[self.double_round>0]
+    return np.quantile(doubled,q) if len(doubled) else np.full(len(q),np.nan)
+
+  def drawdown_quantiles(self,q=(0.5,0.9,0.95,0.99)):
+    return np.quantile(self.max_drawdown,q)
+
+  def __str__(self):
+    q = (0.1,0.5,0.9)
+    return (f"{self.n} trajectories of {self.n_rounds} rounds from {self.bankroll:g} units:\n"
+            f"risk of ruin {self.risk_of_ruin:.4f}, "
+            f"doubled {np.mean(self.double_round>0):.4f}, "
+            f"mean final bankroll {self.final.mean():.2f}\n"
+            f"rounds to double (10%, 50%, 90%): {self.double_quantiles(q)}\n"
+            f"max drawdown (50%, 90%, 95%, 99%): {self.drawdown_quantiles()}")
+
+class BankrollSimulation:
+  """
+  Simulates bankrolls following a bet schedule.
+
+  Args:
+      values, pmf (np.ndarray): The net results of a round per unit bet and
+          their probabilities, see modules.distributions. If values is None,
+          results are normal with mean EV and variance V instead.
+      bankroll (float): The starting bankroll in units. A trajectory is ruined
+          once it has nothing left.
+      bet (float or np.ndarray): The bet of every round in units, or of each
+          round of the trajectories.
+      EV, V (float): The moments of the normal results, if values is None.
+      seed (int, optional): Seeds the random generator for reproducible results.
+  """
+  def __init__(self,values=None,pmf=None,bankroll=100,bet=1,EV=None,V=None,seed=None):
+    self.values = None if values is None else np.asarray(values,dtype=float)
+    if self.values is not None:
+      self.cum_probs = np.cumsum(pmf)/np.sum(pmf)
+      self.EV = float(np.asarray(pmf)@self.values)
+      self.V = float(np.asarray(pmf)@self.values**2-self.EV**2)
+    else:
+      self.EV, self.V = EV, V
+    self.bankroll = bankroll
+    self.bet = bet
+    self.rng = np.random.default_rng(seed)
+
+  @classmethod
+  def from_analysis(cls,bl,bankroll=100,bet=1,seed=None):
+    # Uses the exact outcome distribution if it was computed, see
+    # BlackjackAnalysis.compute(distribution=True), otherwise EV and V
+    if bl.outcome_pmf is not None:
+      return cls(bl.outcome_pmf.index,bl.outcome_pmf.values,bankroll,bet,seed=seed)
+    return cls(bankroll=bankroll,bet=bet,EV=bl.EV,V=bl.V,seed=seed)
+
+  def bets(self,lo,hi):
+    # The bets of rounds lo,...,hi-1
+    if np.ndim(self.bet)==0:
+      return np.full(hi-lo,float(self.bet))
+    return np.asarray(self.bet,dtype=float)[lo:hi]
+
+  def draw(self,shape):
+    # net results per unit bet of independent rounds
+    if self.values is None:
+      return self.rng.normal(self.EV,np.sqrt(self.V),shape)
+    idx = np.searchsorted(self.cum_probs,self.rng.random(shape),side='right')
+    return self.values[np.minimum(idx,len(self.values)-1)]
+
+  def simulate(self,n,n_rounds,max_bytes=2**26):
+    """
+    Simulates n trajectories of n_rounds rounds, a block of rounds at a time.
+
+    Returns:
+        BankrollStats: The outcome of each trajectory.
+    """
+    # about 6 float arrays of (n, block) are alive at once
+    block = int(max(1,min(n_rounds,max_bytes//(48*n))))
+    bankroll = np.full(n,float(self.bankroll))
+    peak = bankroll.copy()
+    max_drawdown = np.zeros(n)
+    ruin_round = np.zeros(n,dtype=np.int64)
+    double_round = np.zeros(n,dtype=np.int64)
+    for lo in range(0,n_rounds,block):
+      hi = min(n_rounds,lo+block)
+      live = np.flatnonzero(ruin_round==0)
+      if len(live)==0:
+        break
+      path = bankroll[live,None]+np.cumsum(self.draw((len(live),hi-lo))*self.bets(lo,hi),axis=1)
+      # Nothing after ruin counts, so the path is held at its value at ruin
+      ruined = path<=0
+      first = np.where(ruined.any(axis=1),ruined.argmax(axis=1),hi-lo)
+      after = np.arange(hi-lo)>first[:,None]
+      path = np.where(after,np.take_along_axis(path,np.minimum(first,hi-lo-1)[:,None],axis=1),path)
+
+      running_peak = np.maximum(np.maximum.accumulate(path,axis=1),peak[live,None])
+      max_drawdown[live] = np.maximum(max_drawdown[live],(running_peak-path).max(axis=1))
+      peak[live] = running_peak[:,-1]
+      bankroll[live] = path[:,-1]
+      ruin_round[live[first<hi-lo]] = lo+first[first<hi-lo]+1
+
+      doubled = path>=2*self.bankroll
+      new = (double_round[live]==0)&doubled.any(axis=1)
+      double_round[live[new]] = lo+doubled[new].argmax(axis=1)+1
+    return BankrollStats(self.bankroll,n_rounds,ruin_round,double_round,max_drawdown,bankroll)
+
+  def run(self,n,n_rounds,chunk=2**14,max_bytes=2**26):
+    # Simulates n trajectories, chunk trajectories at a time
+    stats = None
+    for lo in range(0,n,chunk):
+      s = self.simulate(min(chunk,n-lo),n_rounds,max_bytes)
+      stats = s if stats is None else stats.merge(s)
+    return stats
+
+  def approximations(self,n_rounds):
+    # The closed form results for the average bet of the schedule
+    bets = self.bets(0,n_rounds)
+    EV, V = self.EV*bets.mean(), self.V*(bets**2).mean()
+    return {'N0':N0(EV,V),
+            'risk_of_ruin':risk_of_ruin(EV,V,self.bankroll,n_rounds),
+            'risk_of_ruin_ever':risk_of_ruin(EV,V,self.bankroll),
+            'double_before_ruin':double_before_ruin(EV,V,self.bankroll)}
+
+if __name__ == '__main__':
+  from BlackjackAnalysis import BlackjackAnalysis
+  bl = BlackjackAnalysis()
+  bl.compute(distribution=True)
+  sim = BankrollSimulation.from_analysis(bl,bankroll=100,seed=0)
+  n_rounds = 10**4
+  print(sim.run(10**4,n_rounds))
+  print(sim.approximations(n_rounds))
@@ -1,27 +1,18 @@
-from modules.Deck import Deck
+from modules.Shoe import Shoe
 from modules.Hand import Hand
 from modules.utilities import get_selection
-from BlackjackAnalysis import BlackjackAnalysis
+from modules.Strategy import CompiledStrategy
 
-import os
 import sys
-import numpy as np
-import pandas as pd
-
-# Check if the files exist, otherwise say they don't exist and exit.
-if (os.path.exists('hit_matrix.csv') and
-    os.path.exists('dd_matrix.csv') and
-    os.path.exists('split_matrix.csv')):
-    HIT_MATRIX = pd.read_csv('hit_matrix.csv',    index_col=0)
-    DD_MATRIX = pd.read_csv('dd_matrix.csv',index_col=0)
-    SPLIT_MATRIX = pd.read_csv('split_matrix.csv', index_col=0)
-else:
-    pass
 
 
 
 class BasicStrategyTrainer:
-  def __init__(self):
+  def __init__(self,strategy=None):
+    # The strategy is the cached single deck strategy unless given
+    if strategy is None:
+      strategy = CompiledStrategy.from_cache()
+    self.strategy = strategy
     self.n_turns = 0
     self.n_correct = 0
 
@@ -33,7 +24,7 @@ class BasicStrategyTrainer:
     self.player_hand = None
     self.dealer_hand = None
 
-    self.deck = Deck()
+    self.deck = Shoe()
 
   def print_performance(self):
     print(f"You got {self.n_correct} correct out of {self.n_turns}")
@@ -104,7 +95,7 @@ class BasicStrategyTrainer:
     self.player_hand = None
     self.dealer_hand = None
 
-    self.deck = Deck()
+    self.deck = Shoe()
 
 
   def reset_hands(self):
@@ -115,6 +106,7 @@ class BasicStrategyTrainer:
     self.dealer_hand = None
 
   def start_deal(self):
+    self.deck.new_round()
     cards = self.deck.draw_cards(4)
 
     self.player_hand = Hand()
@@ -124,21 +116,7 @@ class BasicStrategyTrainer:
     self.dealer_hand.add_cards(cards[2:])
 
   def get_correct_action(self):
-    row = self.player_hand.simple_hand_str()
-    hand = Hand()
-    hand.add_card(self.dealer_hand.cards[0])
-    col = hand.simple_hand_str()
-
-    if self.can_split() and SPLIT_MATRIX.loc[row,col]:
-      return 'split'
-
-    if DD_MATRIX.loc[row,col]:
-      return 'double'
-
-    if HIT_MATRIX.loc[row,col]:
-      return 'hit'
-
-    return 'stand'
+    return self.strategy.action(self.player_hand,self.dealer_hand.cards[0],self.can_split())
 
   def can_split(self):
     if self.player_hand.cards[0].value == self.player_hand.cards[1].value:
@@ -147,22 +125,5 @@ class BasicStrategyTrainer:
     return False
 
 if __name__ == '__main__':
-    if (os.path.exists('hit_matrix.csv') and
-    os.path.exists('dd_matrix.csv') and
-    os.path.exists('split_matrix.csv')):
-        pass
-    else:
-        print("Necessary files do not exist. Will compute them.")
-        bl1 = BlackjackAnalysis()
-        print("Computing analysis of Blackjack.")
-        bl1.compute()
-        print("Saving analysis of Blackjack.")
-        bl1.exportStrategy()
-        bl1.exportEV()
-        bl1.exportResults()
-        HIT_MATRIX = pd.read_csv('hit_matrix.csv',    index_col=0)
-        DD_MATRIX = pd.read_csv('dd_matrix.csv',index_col=0)
-        SPLIT_MATRIX = pd.read_csv('split_matrix.csv', index_col=0)
-
     g = BasicStrategyTrainer()
     g.play_game()
\ No newline at end of file
@@ -0,0 +1,161 @@
+from CountEvaluation import BetRamp, shoe_samples, summarize, tag_array
+from BankrollSimulation import risk_of_ruin, N0
+from CardCountingTrainer import count_tags
+import numpy as np
+import pandas as pd
+
+# Chooses a bet ramp (the bet by true count) with common random numbers. The
+# shoes are dealt and their rounds played out once, by
+# CountEvaluation.PlayedShoeSample, and the rounds are binned by their true
+# count.
+# A ramp bets the same in every round of a bin, so its totals are sums over
+# the bins of the bet times the bin's sum of results (and the bet squared
+# times the sum of squared results). Evaluating a ramp is then one product
+# over a few bins, and every ramp is evaluated on the very same rounds, so the
+# differences between ramps are far more precise than each ramp's standard
+# error suggests.
+#
+# Ramps are ranked by:
+# - the win rate per hour,
+# - SCORE, the win per 100 rounds betting optimally (Kelly) from a bankroll of
+#   10000 units, i.e. 10**6*(EV/sd)**2 with the EV and sd per round. It's the
+#   square of the desirability index DI = 1000*EV/sd, and doesn't depend on
+#   the scale of the bets,
+# - the risk of ruin of the bankroll by the Brownian motion approximation of
+#   BankrollSimulation.
+
+def candidate_ramps(max_bets=(4,8,12,16),starts=(0,1,2,3),growths=(1,2,3,4)):
+  """
+  Ramps betting 1 unit below the true count start and growth units per true
+  count from it, up to max_bet: the bet at true count tc is
+  max(1, min(max_bet, growth*(tc-start+1))). Defaults to every combination of
+  the parameters.
+
+  Returns:
+      list: The BetRamps.
+  """
+  ramps = []
+  for max_bet in max_bets:
+    for start in starts:
+      for growth in growths:
+        k = int(np.ceil(max_bet/growth))
+        bets = [1]+[max(1,min(max_bet,growth*(i+1))) for i in range(k)]
+        ramps.append(BetRamp(start+np.arange(k),bets))
+  return ramps
+
+class BetSpreadOptimizer:
+  """
+  The rounds of many simulated shoes, binned by true count, to evaluate bet
+  ramps on.
+
+  Args:
+      tags (dict or np.ndarray, optional): The count's tags. Defaults to the
+          count of CardCountingTrainer.
+      bin_width (float): The width of the true count bins. Ramps are evaluated
+          exactly if their thresholds are multiples of it.
+      tc_range (tuple): The lowest and highest bin's true counts. Every round
+          below (above) is binned with the lowest (highest), so thresholds
+          should be within the range.
+      rounds_per_hour (int): The number of rounds in an hour of play.
+      chunk (int): The number of shoes simulated at a time.
+      fast (bool): Whether to deal the rounds by the fast estimator
+          CountEvaluation.LinearEVShoeSample at cards_per_round rather than
+          playing them out.
+      The rest are as for CountEvaluation.PlayedShoeSample.
+  """
+  def __init__(self,tags=None,n_shoes=10**5,n_decks=6,penetration=0.75,rounds_per_hour=100,
+               bin_width=1,tc_range=(-6,12),rules=None,seed=0,chunk=2**12,fast=False,
+               cards_per_round=5.4):
+    self.tags = tag_array(tags if tags is not None else count_tags())
+    self.rounds_per_hour = rounds_per_hour
+    self.bin_width = bin_width
+    lo, hi = [int(np.floor(tc/bin_width)) for tc in tc_range]
+    # The lowest true count of every bin
+    self.true_counts = np.arange(lo,hi+1)*bin_width
+    n_bins = len(self.true_counts)
+
+    # The number of rounds, sum of results and sum of squared results per bin
+    self.n = np.zeros(n_bins)
+    self.won = np.zeros(n_bins)
+    self.won2 = np.zeros(n_bins)
+    n_dealt = 0
+    for sample in shoe_samples(n_shoes,n_decks,penetration,rules,seed,chunk,fast,cards_per_round):
+      bins = np.clip(np.floor(sample.true_counts(self.tags)/bin_width).astype(np.int64),lo,hi)-lo
+      # Only the rounds the shoes actually had
+      bins, results = bins[sample.played], sample.results[sample.played]
+      self.n += np.bincount(bins,minlength=n_bins)
+      self.won += np.bincount(bins,results,minlength=n_bins)
+      self.won2 += np.bincount(bins,results**2,minlength=n_bins)
+      n_dealt += sample.cards_per_round*len(results)
+    # The average number of cards per round of the shoes
+    self.cards_per_round = n_dealt/self.n.sum()
+
+  def frequencies(self):
+    # The fraction of rounds in every true count bin
+    return pd.Series(self.n/self.n.sum(),index=pd.Index(self.true_counts,name='true_count'))
+
+  def advantages(self):
+    # The EV per round of every true count bin
+    with np.errstate(invalid='ignore'):
+      return pd.Series(self.won/self.n,index=pd.Index(self.true_counts,name='true_count'))
+
+  def bets(self,ramps):
+    # The bet of every ramp in every bin, of shape (ramps, bins)
+    return np.stack([ramp(self.true_counts) for ramp in ramps])
+
+  def totals(self,bets):
+    """
+    The totals (see CountEvaluation.ShoeSample.totals) of betting bets, the
+    bet of every bin, of shape (bins,) or (ramps, bins).
+    """
+    bets = np.asarray(bets,dtype=float)
+    return np.stack([bets@self.won,bets**2@self.won2,bets@self.n,
+                     np.full(bets.shape[:-1],self.n.sum())])
+
+  def evaluate(self,ramps,bankroll=1000):
+    """
+    Evaluates ramps on the binned rounds.
+
+    Args:
+        ramps (list): The BetRamps.
+        bankroll (float): The bankroll in units for the risk of ruin.
+
+    Returns:
+        pd.DataFrame: For every ramp, its spread, average bet, the win rate and
+        standard deviation per hour (with the standard error of the win rate),
+        DI, SCORE, the risk of ruin and N0, the number of rounds for the win
+        to reach one standard deviation, and the average number of cards per
+        round of the shoes.
+    """
+    summary = summarize(self.totals(self.bets(ramps)),self.rounds_per_hour)
+    EV, sd = summary['win_rate'], summary['sd']
+    DI = 1000*EV/sd
+    return pd.DataFrame({'ramp':[str(ramp) for ramp in ramps],
+                         'spread':[ramp.bets.max()/ramp.bets.min() for ramp in ramps],
+                         'average_bet':summary['average_bet'],
+                         'win_per_hour':summary['win_per_hour'],
+                         'sd_per_hour':summary['sd_per_hour'],
+                         'se_per_hour':summary['se_per_hour'],
+                         'DI':DI,'SCORE':np.where(EV>0,DI**2,0),
+                         'risk_of_ruin':[risk_of_ruin(e,s**2,bankroll) for e,s in zip(EV,sd)],
+                         'N0':np.where(EV>0,N0(EV,sd**2),np.inf),
+                         'cards_per_round':self.cards_per_round})
+
+  def rank(self,ramps=None,by='SCORE',bankroll=1000,max_risk_of_ruin=None):
+    """
+    Ranks ramps, best first, by 'win_per_hour', 'SCORE' or 'risk_of_ruin'
+    (lowest first). Ramps default to candidate_ramps(); those with a risk of
+    ruin above max_risk_of_ruin are dropped.
+    """
+    table = self.evaluate(ramps if ramps is not None else candidate_ramps(),bankroll)
+    if max_risk_of_ruin is not None:
+      table = table[table['risk_of_ruin']<=max_risk_of_ruin]
+    return table.sort_values(by,ascending=by=='risk_of_ruin',ignore_index=True)
+
+if __name__ == '__main__':
+  optimizer = BetSpreadOptimizer()
+  with pd.option_context('display.width',200,'display.max_columns',None,'display.max_colwidth',80):
+    print(pd.DataFrame({'frequency':optimizer.frequencies(),'EV':optimizer.advantages()}).T)
+    for by in ['win_per_hour','SCORE','risk_of_ruin']:
+      print(f"\nBest ramps by {by}, risk of ruin of 1000 units at most 20%:")
+      print(optimizer.rank(by=by,max_risk_of_ruin=0.2).head(10))
@@ -1,11 +1,16 @@
 from modules.Card import Card
 from modules.Hand import Hand
+from modules import engine
+from modules import hand_ids
+from modules import cache
+from modules import distributions
+from modules.Rules import Rules
 import pandas as pd
 import numpy as np
 import os
 
 class BlackjackAnalysis():
-  def __init__(self,card_probs=None):
+  def __init__(self,card_probs=None,rules=None):
     # card_probs is dictionary with 10 values
     # keys are 1-10 denoting the Ace-2,3,4...,9,Face card
     # values are the respective probabilities
@@ -14,6 +19,11 @@ class BlackjackAnalysis():
     else:
       self.card_probs = {k:v for k,v in zip([1+x for x in range(10)],[4/52]*9+[16/52])}
 
+    # rules are the table rules, see modules.Rules. Defaults to dealer stands on
+    # all 17s, naturals pay 3:2, double down on any two cards and after splitting,
+    # and no surrender.
+    self.rules = rules if rules is not None else Rules()
+
     # D_probs gives the probability of a dealer starting with the 10 possible
     # starting hands
     self.D_probs = pd.DataFrame.from_dict({ str(k)+',1' if k==1 else str(k)+',0':v for k,v in self.card_probs.items()},
@@ -41,6 +51,8 @@ class BlackjackAnalysis():
     self.hit_matrix = None
     self.dd_matrix = None
     self.split_matrix = None
+    self.surrender_matrix = None
+    self.surrender_pair_matrix = None
 
     self.analysis_present = False
     self.hit_transition_matrix = None
@@ -73,21 +85,44 @@ class BlackjackAnalysis():
     self.EX2D = None
     self.V = None
 
-  def compute(self,computeStrategy=True):
+    self.EV_grad = None
+    self.V_grad = None
+
+    self.outcome_pmf = None
+    self.outcome_pmf_dealer = None
+
+  def compute(self,computeStrategy=True,gradient=False,distribution=False):
     assert computeStrategy or self.strategy_present, "Analysis can't be done without having a strategy or computing one"
+    # The analysis itself runs on integer indexed numpy arrays in modules.engine.
+    # See there for how each of the stages below are computed.
+    # The results are labelled here as DataFrames for exporting.
+    if computeStrategy:
+      hit, dd, split = None, None, None
+    else:
+      hit, dd, split = self.strategyArrays()
+    r = engine.solve(self.probs_array(),hit,dd,split,self.rules)
+
+    hands = self.str_hands
+    dealer_hands = hand_ids.SINGLE_STR_HANDS
+    pair_hands = hand_ids.PAIR_STR_HANDS
+    def hand_frame(x):
+      return pd.DataFrame(x,index=hands,columns=dealer_hands)
+    def pair_frame(x):
+      return pd.DataFrame(x,index=pair_hands,columns=dealer_hands)
+
     # hit_transition_matrix is a stochastic matrix denoting the probability of going
     # from a hand to the next hand after hitting (receiving another card)
-    self.hit_transition_matrix = self.compute_hit_transition_matrix()
+    self.hit_transition_matrix = pd.DataFrame(r['hit_transition_matrix'],index=hands,columns=hands)
 
     # dealer_end_tm is a stochastic matrix denoting the probability of going from a hand
     # to the *final* hand after following how dealers must hit/stand
-    self.dealer_end_tm = self.f_dealer_end_tm()
+    self.dealer_end_tm = pd.DataFrame(r['dealer_end_tm'],index=hands,columns=hands)
 
     # dealer_ps is a stochastic matrix denoting the probability of going from
     # one of the 10 possible startings hands to the possible final hands after
     # following how dealers must hit/stand.
     # The possible final hands are 17,18,...,21,>21 (denoted 22)
-    self.dealer_ps = self.f_dealer_ps()
+    self.dealer_ps = pd.DataFrame(r['dealer_ps'],index=dealer_hands,columns=engine.DEALER_TOTALS)
 
     # dealer_ps2 is the same as dealer_ps except a column is added to differentiate
     # between 21 and a *natural* 21.  A natural 21 is "blackjack" or 21 in two cards.
@@ -95,13 +130,16 @@ class BlackjackAnalysis():
     # player is not given an opportunity to hit in order to possibly draw.
     # The player automatically draws if they also have a natural. Otherwise,
     # they lose.
-    self.dealer_ps2 = self.f_dealer_ps2()
+    ps2 = np.insert(r['dealer_ps'],5,r['natural'],axis=1)
+    ps2[:,4] -= r['natural']
+    self.dealer_ps2 = pd.DataFrame(ps2,index=dealer_hands,
+                                   columns=engine.DEALER_TOTALS[:-1]+['Natural 21',22])
 
     # dealer_ps is a stochastic matrix denoting the *conditional* probability of going from
     # one of the 10 possible startings hands to the possible final hands after
     # following how dealers must hit/stand *given* the dealer doesn't have a natural.
     # See above for motivation.
-    self.dealer_ps_nn = self.f_dealer_ps_nn()
+    self.dealer_ps_nn = pd.DataFrame(r['dealer_ps_nn'],index=dealer_hands,columns=engine.DEALER_TOTALS)
 
     # dealer_cs_nn is a matrix denoting the cumalative probability of going from
     # one of the 10 possible starting hands to the possible final hands after
@@ -112,44 +150,26 @@ class BlackjackAnalysis():
     # P(dealer ends with sum <= xT |start with hand x0 and dealer doesn't get a natural)
     # This is used as part of determining the probability of beating the dealer.
     # (having a sum greater than the dealer)
-    self.dealer_cs_nn = self.dealer_ps_nn.cumsum(axis=1)
+    self.dealer_cs_nn = pd.DataFrame(r['dealer_cs_nn'],index=dealer_hands,columns=engine.DEALER_TOTALS)
 
     # E_hold gives the expected value of holding for a specific hand of the player and
     # specific hand showing for the dealer.
     # Winning has value +1, drawing has value 0, and losing has value -1.
-    self.E_hold = self.f_E_hold()
+    self.E_hold = hand_frame(r['E_hold'])
 
     # E_hit gives the expected value *hitting exactly once and then holding*
     # for a specific hand of the player and a specific hand showing for the dealer.
-    self.E_hit = self.f_E_hit()
+    self.E_hit = hand_frame(r['E_hit'])
 
-    if computeStrategy:
-      # hit_matrix is true when you should hit for a specific hand of the player
-      # and specific hand showing for the dealer.
-      # It checks whether the expected value of hitting once and then holding
-      # is greater than the expected value of just holding.
-      # >= is used because if hitting once and then holding is just as good,
-      # you may as well hit (and hitting twice might be even better than holding)
-      # np.isclose is added due to floating point error
-      self.hit_matrix = ((self.E_hit>=self.E_hold)|
-                         np.isclose(self.E_hit,self.E_hold,atol=1e-9))
-
-    # E_M gives the expected value of following the hitting strategy calculated
-    # above at a specific hand for the player and specific hand showing for the dealer.
-    self.E_M = self.f_E_M()
+    # E_M gives the expected value of following the hitting strategy
+    # at a specific hand for the player and specific hand showing for the dealer.
+    self.E_M = hand_frame(r['E_M'])
 
     # E_dd gives the expected value of doubling down at a specific hand for the
     # player and specific hand showing for the dealer. Doubling down doubles your bet
     # but limits you to only be allowed to draw hit once and then hold. That's exactly
     # double what we calculated as E_hit.
-    self.E_dd = 2*self.E_hit
-
-    if computeStrategy:
-      # dd_matrix is true when you should double down for a specific hand of the player
-      # and specific hand showing for the dealer.
-      # It checks whether the expected value of doubling down is greater than
-      # the expected value of following the hitting strategy calculated above.
-      self.dd_matrix = self.E_dd>self.E_M
+    self.E_dd = hand_frame(r['E_dd'])
 
     # E_split gives the expected value of splitting at a possible splitting hand of the player
     # and specific hand showing for the dealer.
@@ -158,20 +178,38 @@ class BlackjackAnalysis():
     # Splitting divides a hand of two cards of equal value into two individual hands
     # and bets the current bet on each new hand.
     # When aces are split, only one more card may be drawn.
-    self.E_split = self.f_E_split()
+    self.E_split = pair_frame(r['E_split'])
 
-    # E_split gives the expected values of not splitting and instead following
-    # the hitting and doubling down strategy computed above at a possible
+    # E_nosplit gives the expected values of not splitting and instead following
+    # the hitting and doubling down strategy at a possible
     # splitting hand of the player and specific hand showing for the dealer.
-    # It's essentially just the element wise maximum of E_M and E_dd.
-    self.E_nosplit = self.f_E_nosplit()
+    self.E_nosplit = pair_frame(r['E_nosplit'])
 
     if computeStrategy:
+      # hit_matrix is true when you should hit for a specific hand of the player
+      # and specific hand showing for the dealer.
+      # It's found by backward induction from the highest sums down: you should
+      # hit when hitting and then continuing to play optimally is at least as
+      # good as just holding.
+      self.hit_matrix = hand_frame(r['hit_matrix'])
+
+      # dd_matrix is true when you should double down for a specific hand of the player
+      # and specific hand showing for the dealer.
+      # It checks whether the expected value of doubling down is greater than
+      # the expected value of following the hitting strategy.
+      self.dd_matrix = hand_frame(r['dd_matrix'])
+
       # split_matrix is true when you should split at a possible splitting hand
       # of the player of the player and specific hand showing for the dealer.
       # It checks whether the expected value of splitting  is greater than
-      # the expected value of following not splitting strategy calculated above.
-      self.split_matrix = self.E_split>self.E_nosplit
+      # the expected value of following not splitting strategy.
+      self.split_matrix = pair_frame(r['split_matrix'])
+
+    # surrender_matrix is true when you should surrender a hand that isn't a pair
+    # and surrender_pair_matrix when you should surrender a pair, if the rules
+    # allow late surrender. Surrendering loses half the bet.
+    self.surrender_matrix = hand_frame(r['surrender_matrix'])
+    self.surrender_pair_matrix = pair_frame(r['surrender_pair_matrix'])
 
     #EV stuff
     # natural_prob is the probability of getting 21 in two cards
@@ -180,60 +218,69 @@ class BlackjackAnalysis():
     # hole_hand_probs is the remaining probability of other hands. Aka the
     # probability of a certain hand minus the probability that its a natural or a pair
     # the "hole" in blackjack is your first two cards.
-    (self.natural_prob,
-     self.hole_pair_probs,
-     self.hole_hand_probs) = self.compute_hole_probs()
+    self.natural_prob = r['natural_prob']
+    self.hole_pair_probs = pd.Series(r['hole_pair_probs'],index=pair_hands)
+    self.hole_hand_probs = pd.Series(r['hole_hand_probs'],index=hands)
 
     # EVD is the expected value for each specific hand shown by the dealer.
-    self.EVD = self.f_EVD()
+    self.EVD = pd.Series(r['EVD'],index=dealer_hands)
     # EV is the expected value of playing a hand of blackjack.
-    self.EV = self.EVD.multiply(self.D_probs).sum()
+    self.EV = r['EV']
 
     # These are used to calculate the variance instead of expected values.
     # They are computed quite similarly. The identity Var(X)=E(X**2)-(E(X))**2
     # is quite useful here. First E(X**2) is calculated. Then finally the identity
     # is used to find the variance.
-    self.EX2_hold = self.f_E_hold(X2=True)
-    self.EX2_hit = self.f_E_hit(X2=True)
-    self.EX2_M = self.f_E_M(X2=True)
-    self.EX2_dd = 4*self.EX2_hit #E((2X)**2)=4E(X**2)
-    self.EX2_split = self.f_E_split(X2=True)
-    self.EX2_nosplit = self.f_E_nosplit(X2=True)
-    self.EX2D = self.f_EX2D()
-    self.V = self.EX2D.multiply(self.D_probs).sum()-self.EV**2
+    self.EX2_hold = hand_frame(r['EX2_hold'])
+    self.EX2_hit = hand_frame(r['EX2_hit'])
+    self.EX2_M = hand_frame(r['EX2_M'])
+    self.EX2_dd = hand_frame(r['EX2_dd'])
+    self.EX2_split = pair_frame(r['EX2_split'])
+    self.EX2_nosplit = pair_frame(r['EX2_nosplit'])
+    self.EX2D = pd.Series(r['EX2D'],index=dealer_hands)
+    self.V = r['V']
+
+    if gradient:
+      # EV_grad and V_grad are the derivatives of EV and V with respect to the
+      # probability of each card value, holding the strategy fixed.
+      # They give the change in EV for any change in composition,
+      # EV(card_probs + dp) ~ EV + EV_grad.dp
+      g = engine.solve_gradient(self.probs_array(),r['hit_matrix'],r['dd_matrix'],r['split_matrix'],self.rules)
+      self.EV_grad = pd.Series(g['EV_grad'],index=range(1,11))
+      self.V_grad = pd.Series(g['V_grad'],index=range(1,11))
+
+    if distribution:
+      # outcome_pmf is the probability of every possible net result of a
+      # round, see modules.distributions, and outcome_pmf_dealer the same for
+      # each hand showing for the dealer. Its variance counts the dependence
+      # of the two halves of a split through the dealer's hand, unlike V.
+      d = distributions.solve_distribution(self.probs_array(),r['hit_matrix'],r['dd_matrix'],
+                                           r['split_matrix'],self.rules)
+      self.outcome_pmf = pd.Series(d['pmf'],index=d['values'])
+      self.outcome_pmf_dealer = pd.DataFrame(d['pmf_dealer'],index=dealer_hands,columns=d['values'])
 
     self.analysis_present = True
     if computeStrategy:
       self.strategy_present = True
 
-  def compute_hole_probs(self):
-    # natural_prob is the probability of getting 21 in two cards
-    # aka blackjack.
-    # hole_pair_probs is the probability of getting a pair in your first two cards.
-    # hole_hand_probs is the remaining probability of other hands. Aka the
-    # probability of a certain hand minus the probability that its a natural or a pair
-    # the "hole" in blackjack is your first two cards.
-    natural_prob = 0
-    hole_pair_probs = pd.Series(index=Hand.get_pair_simple_hands_str(),dtype=float).fillna(0)
-    hole_state_probs = pd.Series(index=self.str_hands,dtype=float).fillna(0)
-
-    for card1,p1 in self.card_probs.items():
-      for card2,p2 in self.card_probs.items():
-        if min(card1,card2)==1:
-          ace=1
-        else:
-          ace=0
-        state = (card1+card2,ace)
-        if state==(11,1):
-          natural_prob+=p1*p2
-          continue
-        if card1==card2:
-          hole_pair_probs.loc[self.hand_to_string(state)]+=p1*p2
-          continue
-
-        hole_state_probs.loc[self.hand_to_string(state)]+=p1*p2
-
-    return natural_prob, hole_pair_probs, hole_state_probs
+  def estimate_EV(self,card_probs):
+    # A first order estimate of the EV of another composition from EV_grad,
+    # following the same strategy.
+    assert self.EV_grad is not None, "compute(gradient=True) is needed for estimates"
+    dp = np.array([card_probs[k] for k in range(1,11)])-self.probs_array()
+    return self.EV+self.EV_grad.values@dp
+
+  def probs_array(self):
+    # card_probs as an array ordered Ace,2,...,9,Face card
+    return np.array([self.card_probs[k] for k in range(1,11)],dtype=float)
+
+  def strategyArrays(self):
+    # The strategy matrices as boolean arrays in the order used by modules.engine.
+    # Imported strategies are reindexed since csv files may be ordered differently.
+    hit = self.hit_matrix.loc[self.str_hands,hand_ids.SINGLE_STR_HANDS].to_numpy(dtype=bool)
+    dd = self.dd_matrix.loc[self.str_hands,hand_ids.SINGLE_STR_HANDS].to_numpy(dtype=bool)
+    split = self.split_matrix.loc[hand_ids.PAIR_STR_HANDS,hand_ids.SINGLE_STR_HANDS].to_numpy(dtype=bool)
+    return hit, dd, split
 
   def exportStrategy(self,path="",pretty=False):
     assert self.analysis_present, "Strategy isn't avaiable to export"
@@ -242,7 +289,15 @@ class BlackjackAnalysis():
     self.dd_matrix.to_csv(os.path.join(path,'dd_matrix'+'.csv'))
     self.split_matrix.to_csv(os.path.join(path,'split_matrix'+'.csv'))
 
-  def importStrategy(self,path=""):
+  def importStrategy(self,path=None):
+    # Without a path, the strategy for card_probs is taken from modules.cache
+    # (computing it only if it isn't cached). Otherwise it's read from the csv
+    # files exported to path.
+    if path is None:
+      a = cache.analysis(self.probs_array(),self.rules)
+      self.setStrategyArrays(a['hit_matrix'],a['dd_matrix'],a['split_matrix'])
+      return
+
     self.hit_matrix = pd.read_csv(os.path.join(path,'hit_matrix.csv'),
                                   index_col=0)
     self.dd_matrix = pd.read_csv(os.path.join(path,'dd_matrix.csv'),
@@ -252,6 +307,15 @@ class BlackjackAnalysis():
 
     self.strategy_present = True
 
+  def setStrategyArrays(self,hit,dd,split):
+    # The inverse of strategyArrays
+    dealer_hands = hand_ids.SINGLE_STR_HANDS
+    self.hit_matrix = pd.DataFrame(np.array(hit,dtype=bool),index=self.str_hands,columns=dealer_hands)
+    self.dd_matrix = pd.DataFrame(np.array(dd,dtype=bool),index=self.str_hands,columns=dealer_hands)
+    self.split_matrix = pd.DataFrame(np.array(split,dtype=bool),index=hand_ids.PAIR_STR_HANDS,columns=dealer_hands)
+
+    self.strategy_present = True
+
   def exportResults(self,path=""):
     assert self.analysis_present and  self.strategy_present, "Strategy or analysis isn't avaiable to export"
     a = self.analysisResults()
@@ -268,6 +332,9 @@ class BlackjackAnalysis():
       'dd_matrix':self.dd_matrix,
       'split_matrix':self.split_matrix
     }
+    if self.rules.surrender:
+      b['surrender_matrix'] = self.surrender_matrix
+      b['surrender_pair_matrix'] = self.surrender_pair_matrix
     return b
 
   def exportEV(self,path=""):
@@ -300,240 +367,14 @@ class BlackjackAnalysis():
           'EX2_split':self.EX2_split,
           'EX2_nosplit':self.EX2_nosplit,
           'EX2D':self.EX2D,
-          'V':self.V
+          'V':self.V,
+          'EV_grad':self.EV_grad,
+          'V_grad':self.V_grad,
+          'outcome_pmf':self.outcome_pmf,
+          'outcome_pmf_dealer':self.outcome_pmf_dealer
          }
     return a
 
-  def compute_hit_transition_matrix(self):
-    tm = pd.DataFrame(index=self.str_hands,columns=self.str_hands,dtype=float).fillna(0)
-    #for every hand, compute the probability of the next possible hands
-    for str_hand in self.str_hands:
-      hand0 = self.string_to_hand(str_hand)
-      sum0 = hand0[0]
-      ace0 = hand0[1]
-      for card,p in self.card_probs.items():
-        # useable ace logic
-        # if you have an ace and using that ace (adding 10) doesn't make you bust
-        # (go over 21), then you have a useable ace
-        if (card==1 or ace0==1) and (sum0+card+10<=21):
-          ace1=1
-        else:
-          ace1=0
-        sum1 = min(sum0+card,22)
-        hand1 = (sum1,ace1)
-        tm.loc[str_hand,self.hand_to_string(hand1)]+=p
-    return tm
-
-  def f_dealer_end_tm(self):
-    tm = pd.DataFrame(index=self.str_hands,columns=self.str_hands,dtype=float).fillna(0)
-    # for every hand, compute the probability of terminal hand given how dealers
-    # must hit/stand
-    # Note that we iterate from over the hands in a certain order to do dynamic
-    # programming.
-    # I.e recusion over,
-    # P(XT = xT|X0=x0) = Sum over x1>x0 and x1 reachable from x0
-    # of P(XT=xT|X1=x1)P(X1=x1|X0=x0)
-    for str_hand in self.sorted_str_hands:
-      hand0 = self.string_to_hand(str_hand)
-      sum0 = hand0[0]
-      ace0 = hand0[1]
-      # Dealers must stand if sum (after adding useable ace) is above or equal to 17
-      # Hence if you start above or equal to 17, then you just stand and end there.
-      if sum0+ace0*10>=17:
-        tm.loc[str_hand,str_hand]=1
-        continue
-
-      # Otherwise the dealer hits and can end up in several other new hands.
-      # The probability of where you ultimately end up is the sum of
-      # the probabilities of where the new hands end up,
-      # multiplied by the probability of each new hand.
-      hit_row = self.hit_transition_matrix.loc[str_hand,:]
-      for str_hand1,p in zip(hit_row.index,hit_row):
-        tm.loc[str_hand,:]+=p*tm.loc[str_hand1,:]
-
-    return tm
-
-  def f_dealer_ps(self):
-    ps = pd.DataFrame(index=self.str_hands,columns=list(range(17,23)),dtype=float)
-    for str_hand in self.str_hands:
-      for end_sum in ps.columns:
-        if end_sum!=22:
-          # There are two ways to end with sum X.
-          # Either you have sum X or or end with sum X-10 and a useable ace.
-          str_state0 = self.hand_to_string((end_sum,0))
-          str_state1 = self.hand_to_string((end_sum-10,1))
-          ps.loc[str_hand,end_sum] = (self.dealer_end_tm.loc[str_hand,str_state0]+
-                                    self.dealer_end_tm.loc[str_hand,str_state1])
-        else:
-          ps.loc[str_hand,end_sum] = self.dealer_end_tm.loc[str_hand,'22,0']
-
-    # We're only interested in the probabilities from a dealer's starting hand
-    # with a single card, which correspond to the following hands.
-    ps = ps.loc[Hand.get_single_card_simple_hands_str(),:]
-    return ps
-
-  def f_dealer_ps2(self):
-    # Adds a column of probability of Natural 21s from dealer starting cards
-    natural21 = pd.Series(index=Hand.get_single_card_simple_hands_str(),dtype=float,name='Natural 21').fillna(0)
-    natural21.loc['1,1']=self.card_probs[10]
-    natural21.loc['10,0']=self.card_probs[1]
-    ps2 = pd.concat([self.dealer_ps.loc[:,self.dealer_ps.columns[self.dealer_ps.columns<21]],
-                     self.dealer_ps.loc[:,21]-natural21.values,
-                     natural21,
-                     self.dealer_ps.loc[:,self.dealer_ps.columns[self.dealer_ps.columns>21]]],axis=1)
-    return ps2
-
-  #nn stands for non_natural
-  def f_dealer_ps_nn(self):
-    # From definition of conditional probability
-    # P(A|B)=P(A and B)/P(B). In this case B is "non-natural 21"
-    # P(not getting a natural)=1-P(getting a natural)
-    ps_nn = self.dealer_ps2.divide(1-self.dealer_ps2.loc[:,'Natural 21'],axis=0)
-    ps_nn = ps_nn.drop('Natural 21',axis=1)
-    return ps_nn
-
-  #X2 means calculating E(X**2) instead of E(X). Just square all outcomes.
-  def f_E_hold(self,X2=False):
-    E1 = pd.DataFrame(index=self.str_hands,columns=Hand.get_single_card_simple_hands_str(),dtype=float)
-    for str_hand in self.str_hands:
-      hand0 = self.string_to_hand(str_hand)
-      sum0 = hand0[0]
-      ace0 = hand0[1]
-      score = sum0+ace0*10
-
-      #if you bust, then you lose right away, -1
-      if score>21:
-        if not X2:
-          E1.loc[str_hand,:]=-1
-        else:
-          E1.loc[str_hand,:]=1
-        continue
-
-      p_dealer_bust = self.dealer_ps_nn.loc[:,22].values
-
-      if score>=18:
-        # If you score 18 or more then you might beat the dealer without the dealer busting
-        # You score more with probability P(dealer terminal score < score)
-        # = P(dealer terminal score <= score - 1)
-        # which is just self.dealer_cs_nn.loc[:,score-1].values
-        p_player_more = self.dealer_cs_nn.loc[:,score-1].values
-      else:
-        p_player_more = 0
-      # if score>=17:
-      #   p_draw=0*self.dealer_ps_nn.loc[:,score]
-
-      if score<=16:
-        # if you score less than 17, then a dealer beats you as long as they don't bust
-        p_dealer_more = 1-p_dealer_bust
-      else:
-        # otherwise the dealer wins with P(dealer terminal score > score and dealer doesn't bust)
-        # = 1-P(dealer terminal score <= score or dealer busts)
-        # = 1-P(dealer terminal score <= score)-P(dealer busts)
-        p_dealer_more = 1-p_dealer_bust-self.dealer_cs_nn.loc[:,score].values
-
-      if not X2:
-        #Otherwise you win (+1) if the dealer busts or you have more than the dealer.
-        #if the dealer has more you lose (-1)
-        E1.loc[str_hand,:]=(p_dealer_bust+p_player_more)-(p_dealer_more)
-      else:
-        E1.loc[str_hand,:]=(p_dealer_bust+p_player_more)+(p_dealer_more)
-    return E1
-
-  def f_E_hit(self, X2=False):
-    E1 = pd.DataFrame(index=self.str_hands,columns=Hand.get_single_card_simple_hands_str(),dtype=float).fillna(0)
-    # the expected value of hitting once and holding is just the expected value
-    # of the hands you can reach hitting once multiplied by their probability.
-    for str_hand in self.str_hands:
-      hit_row = self.hit_transition_matrix.loc[str_hand,:]
-      for str_hand1,p in zip(hit_row.index,hit_row):
-        if not X2:
-          E1.loc[str_hand,:]+=p*self.E_hold.loc[str_hand1,:].values
-        else:
-          E1.loc[str_hand,:]+=p*self.EX2_hold.loc[str_hand1,:].values
-    return E1
-
-  def f_E_M(self,X2=False):
-    # for every hand, compute the expected value given how players
-    # hit/stand according to the calculated optimal hit/stand  strategy.
-    # Note that we iterate from over the hands in a certain order to do dynamic
-    # programming.
-    # I.e recusion over,
-    # E(XT = xT|X0=x0) = Sum over x1>x0 and x1 reachable from x0
-    # of E(XT=xT|X1=x1)P(X1=x1|X0=x0)
-    E1 = pd.DataFrame(index=self.str_hands,columns=Hand.get_single_card_simple_hands_str(),dtype=float).fillna(0)
-    for str_hand in self.sorted_str_hands:
-      if str_hand == '22,0':
-        if not X2:
-          E1.loc[str_hand,:]=-1
-        else:
-          E1.loc[str_hand,:]=1
-        continue
-
-      hit_trow = self.hit_transition_matrix.loc[str_hand,:]
-      to_hit_row = self.hit_matrix.loc[str_hand,:]
-      if not X2:
-        #if you don't hit then your EV is the EV of holding
-        E1.loc[str_hand,E1.columns[~to_hit_row]]=self.E_hold.loc[str_hand,self.E_hold.columns[~to_hit_row]].values
-      else:
-        E1.loc[str_hand,E1.columns[~to_hit_row]]=self.EX2_hold.loc[str_hand,self.EX2_hold.columns[~to_hit_row]].values
-      # otherwise you hit, and your EV is the sum of the EV of the new hands multiplied by
-      # their probability
-      for str_hand1,p in zip(hit_trow.index,hit_trow):
-        E1.loc[str_hand,E1.columns[to_hit_row]]+=p*E1.loc[str_hand1,E1.columns[to_hit_row]].values
-    return E1
-
-  def f_E_split(self,X2=False):
-    E1 = pd.DataFrame(index=Hand.get_pair_simple_hands_str(),columns=Hand.get_single_card_simple_hands_str(),dtype=float).fillna(0)
-    for str_hand in E1.index:
-      hand = self.string_to_hand(str_hand)
-      split_hand = (hand[0]//2,hand[1])
-
-      hit_trow = self.hit_transition_matrix.loc[self.hand_to_string(split_hand),:]
-      for str_hand1,p in zip(hit_trow.index,hit_trow):
-
-        if str_hand=='2,1':
-          # when splitting aces you can only hit once and hold
-          if not X2:
-            E1.loc[str_hand,:]+=2*p*self.E_hold.loc[str_hand1,:].values
-          else:
-            # Not just multiplied by 4 because it's not E((2X)**2) but E((X+Y)**2)
-            # Where X and Y are iid. E((X+Y)**2)=E(X**2+2XY+Y**2)
-            # = 2E(X**2)+4E(X)
-            E1.loc[str_hand,:]+=(2*p*self.EX2_hold.loc[str_hand1,:].values
-                                 +4*p*self.E_hold.loc[str_hand1,:].values)
-          continue
-
-        # otherwise you'll double down or follow hit/stand strategy depending on
-        # dealer hand showing.
-        dds = self.dd_matrix.loc[str_hand1,:]
-        if not X2:
-          E1.loc[str_hand,E1.columns[dds]]+=2*p*self.E_dd.loc[str_hand1,E1.columns[dds]].values
-          E1.loc[str_hand,E1.columns[~dds]]+=2*p*self.E_M.loc[str_hand1,E1.columns[~dds]].values
-        else:
-          # Not just multiplied by 4 because it's not E((2X)**2) but E((X+Y)**2)
-          # Where X and Y are iid. E((X+Y)**2)=E(X**2+2XY+Y**2)
-          # = 2E(X**2)+4E(X)
-          E1.loc[str_hand,E1.columns[dds]]+=(2*p*self.EX2_dd.loc[str_hand1,E1.columns[dds]].values
-                                             +4*p*self.E_dd.loc[str_hand1,E1.columns[dds]].values)
-          E1.loc[str_hand,E1.columns[~dds]]+=(2*p*self.EX2_M.loc[str_hand1,E1.columns[~dds]].values
-                                            +4*p*self.E_M.loc[str_hand1,E1.columns[~dds]].values)
-    return E1
-
-  def f_E_nosplit(self,X2=False):
-    # if you don't split you'll double down or follow hit/stand strategy depending on
-    # dealer hand showing.
-    E1 = pd.DataFrame(index=Hand.get_pair_simple_hands_str(),columns=Hand.get_single_card_simple_hands_str(),dtype=float).fillna(0)
-    for str_hand in E1.index:
-      dds = self.dd_matrix.loc[str_hand,:]
-      if not X2:
-        E1.loc[str_hand,E1.columns[dds]]=self.E_dd.loc[str_hand,E1.columns[dds]].values
-        E1.loc[str_hand,E1.columns[~dds]]=self.E_M.loc[str_hand,E1.columns[~dds]].values
-      else:
-        E1.loc[str_hand,E1.columns[dds]]=self.EX2_dd.loc[str_hand,E1.columns[dds]].values
-        E1.loc[str_hand,E1.columns[~dds]]=self.EX2_M.loc[str_hand,E1.columns[~dds]].values
-
-    return E1
-
   @staticmethod
   def get_sorted_str_hands(hands,str_hands):
     sorted_hands = list(zip(hands,str_hands))
@@ -559,53 +400,6 @@ class BlackjackAnalysis():
   def string_to_hand(str_hand):
     return tuple(map(int,str_hand.split(',')))
 
-  def f_EVD(self):
-    EV_natural = 1.5*self.natural_prob
-
-    EV_pair_split = (self.E_split*self.split_matrix).multiply(self.hole_pair_probs,axis='index')
-    EV_pair_nsplit = (self.E_nosplit*(~self.split_matrix)).multiply(self.hole_pair_probs,axis='index')
-
-    EV_non_pair_dd = (self.E_dd*self.dd_matrix).multiply(self.hole_hand_probs,axis='index')
-    EV_non_pair_ndd = (self.E_M*(~self.dd_matrix)).multiply(self.hole_hand_probs,axis='index')
-
-
-    EV_dealer_nn = (EV_pair_split.sum(axis='index')+
-                    EV_pair_nsplit.sum(axis='index')+
-                    EV_non_pair_dd.sum(axis='index')+
-                    EV_non_pair_ndd.sum(axis='index')+
-                    EV_natural)
-
-    EV_dealer_n = -1*(1-self.natural_prob)
-
-    EVD=(self.dealer_ps2.loc[:,'Natural 21']*EV_dealer_n+
-     (1-self.dealer_ps2.loc[:,'Natural 21'])*EV_dealer_nn)
-
-    return EVD
-
-  def f_EX2D(self):
-    EX2_natural = (1.5**2)*self.natural_prob
-
-    EX2_pair_split = (self.EX2_split*self.split_matrix).multiply(self.hole_pair_probs,axis='index')
-    EX2_pair_nsplit = (self.EX2_nosplit*(~self.split_matrix)).multiply(self.hole_pair_probs,axis='index')
-
-    EX2_non_pair_dd = (self.EX2_dd*self.dd_matrix).multiply(self.hole_hand_probs,axis='index')
-    EX2_non_pair_ndd = (self.EX2_M*(~self.dd_matrix)).multiply(self.hole_hand_probs,axis='index')
-
-
-
-    EX2_dealer_nn = (EX2_pair_split.sum(axis='index')+
-                    EX2_pair_nsplit.sum(axis='index')+
-                    EX2_non_pair_dd.sum(axis='index')+
-                    EX2_non_pair_ndd.sum(axis='index')+
-                    EX2_natural)
-
-    EX2_dealer_n = 1*(1-self.natural_prob)
-
-    VD=(self.dealer_ps2.loc[:,'Natural 21']*EX2_dealer_n+
-    (1-self.dealer_ps2.loc[:,'Natural 21'])*EX2_dealer_nn)
-
-    return VD
-  
 if __name__ == '__main__':
     bl1 = BlackjackAnalysis()
     print("Computing analysis of Blackjack.")
@@ -1,18 +1,22 @@
 from modules.Player import Player
-from modules.Deck import Deck
+from modules.Shoe import Shoe
 from modules.Hand import Hand
 from modules.utilities import get_integer, get_selection
 
 class BlackjackGame:
-  def __init__(self):
-    # A game has a Player, a dealer's hand, a pot, and a Deck
+  def __init__(self,n_decks=1,penetration=None,strategy=None):
+    # A game has a Player, a dealer's hand, a pot, and a Shoe of n_decks decks.
+    # If penetration is given, the shoe is reshuffled between rounds once
+    # that fraction of it has been dealt.
+    # If a CompiledStrategy is given, its action is suggested at every decision.
+    self.strategy = strategy
     self.player = Player()
 
     self.dealer_hand = None
     self.dealer_revealed = False
     #bet probably needs to be changed for one per hand
     #as in a list of bets
-    self.deck = Deck()
+    self.deck = Shoe(n_decks,penetration)
 
   def reset(self):
     self.deck.add_to_discard(self.dealer_hand.cards)
@@ -30,6 +34,7 @@ class BlackjackGame:
 
 
   def start_deal(self):
+    self.deck.new_round()
     cards = self.deck.draw_cards(4)
 
     self.player.hands.append(Hand())
@@ -100,6 +105,14 @@ class BlackjackGame:
     if self.can_split(hand):
       options.append('split')
 
+    if self.strategy is not None:
+      suggestion = self.strategy.action(hand,self.dealer_hand.cards[0],self.can_split(hand),
+                                        self.can_double(hand))
+      if suggestion == 'double':
+        suggestion = 'double down'
+      if suggestion in options:
+        print(f"Basic strategy says to {suggestion}.")
+
     action_str = ', '.join(['\''+x+'\'' for x in options])
     action = get_selection(f"You can {action_str}. Select one.\n",
                            options)
@@ -0,0 +1,339 @@
+from modules import hand_ids
+from modules.Rules import Rules
+from concurrent.futures import ProcessPoolExecutor
+import os
+import numpy as np
+
+# Headless simulation of rounds of Blackjack played following the strategy
+# matrices of BlackjackAnalysis. Many independent rounds are played at once as
+# numpy arrays. Hands are tracked as (simple_score, has_ace) like Hand.
+# Cards are drawn with replacement using card_probs, which is the same
+# infinite deck assumption as BlackjackAnalysis, so the results can be checked
+# against its EV and V. Every card is dealt through deal(rounds), which knows
+# the rounds the cards go to, so ShoeSimulation deals them from shuffled shoes
+# instead.
+
+# Net results of a round are multiples of half a bet (a natural pays 1.5).
+# They're counted in a histogram over half bets from -MAX_RESULT to +MAX_RESULT bets.
+MAX_RESULT = 8
+N_BINS = 4*MAX_RESULT+1
+
+class SimulationStats:
+  """
+  Statistics of simulated rounds, kept as a histogram of the net result of
+  each round in half bets. Since the counts are integers, results of separate
+  simulations merge exactly by adding histograms.
+  """
+  def __init__(self,histogram=None):
+    if histogram is None:
+      histogram = np.zeros(N_BINS,dtype=np.int64)
+    self.histogram = histogram
+
+  @staticmethod
+  def results():
+    # The net result of each bin of the histogram
+    return np.arange(-2*MAX_RESULT,2*MAX_RESULT+1)/2
+
+  def add(self,results):
+    # results are the net results of rounds, multiples of 0.5
+    self.histogram += np.bincount((2*results).astype(np.int64)+2*MAX_RESULT,minlength=N_BINS)
+
+  def merge(self,other):
+    return SimulationStats(self.histogram+other.histogram)
+
+  @property
+  def n(self):
+    return int(self.histogram.sum())
+
+  @property
+  def EV(self):
+    # The sums are exact integers (in half bets) before dividing
+    return int(self.histogram@np.arange(-2*MAX_RESULT,2*MAX_RESULT+1))/(2*self.n)
+
+  @property
+  def EX2(self):
+    return int(self.histogram@np.arange(-2*MAX_RESULT,2*MAX_RESULT+1)**2)/(4*self.n)
+
+  @property
+  def V(self):
+    return self.EX2-self.EV**2
+
+  @property
+  def std_err(self):
+    return np.sqrt(self.V/self.n)
+
+  def confidence_interval(self,z=1.96):
+    return self.EV-z*self.std_err, self.EV+z*self.std_err
+
+  def __str__(self):
+    lo, hi = self.confidence_interval()
+    return (f"{self.n} rounds: EV = {self.EV:.6f} (95% CI {lo:.6f}, {hi:.6f}), "
+            f"V = {self.V:.6f}")
+
+class BlackjackSimulation:
+  def __init__(self,hit,dd,split,card_probs=None,seed=None,rules=None):
+    # hit, dd and split are the boolean strategy matrices as arrays,
+    # see BlackjackAnalysis.strategyArrays.
+    # card_probs is an array of the probabilities of the card values Ace,2,...,9,Face card.
+    # rules are the table rules, see modules.Rules. Late surrender isn't simulated.
+    if card_probs is None:
+      card_probs = np.array([4/52]*9+[16/52])
+    self.rules = rules if rules is not None else Rules()
+    assert not self.rules.surrender, "Late surrender isn't simulated"
+    self.hit = np.asarray(hit,dtype=bool)
+    self.dd = np.asarray(dd,dtype=bool)
+    self.split = np.asarray(split,dtype=bool)
+    self.cum_probs = np.cumsum(card_probs)/np.sum(card_probs)
+    self.rng = np.random.default_rng(seed)
+
+  @classmethod
+  def from_analysis(cls,bl,seed=None):
+    # Simulates the strategy and composition of a BlackjackAnalysis
+    return cls(*bl.strategyArrays(),card_probs=bl.probs_array(),seed=seed,rules=bl.rules)
+
+  @classmethod
+  def from_strategy(cls,strategy,card_probs=None,seed=None):
+    # Simulates a CompiledStrategy
+    return cls(*strategy.arrays(),card_probs=card_probs,seed=seed)
+
+  def draw(self,n):
+    # values of n cards drawn with replacement
+    return np.minimum(np.searchsorted(self.cum_probs,self.rng.random(n),side='right'),9)+1
+
+  def deal(self,rounds):
+    # values of a card for each of the rounds (indices of distinct rounds)
+    return self.draw(len(rounds))
+
+  @staticmethod
+  def hand_ids(total,ace):
+    useable = ace&(total<=11)
+    return hand_ids.HAND_ID_TABLE[np.minimum(total,22),useable.astype(int)]
+
+  @staticmethod
+  def scores(total,ace):
+    return np.where(ace&(total<=11),total+10,total)
+
+  def play_hands(self,total,ace,upcard,rounds):
+    # Hits each hand until the hit matrix says to stand or it busts. rounds are
+    # the rounds of the hands. total and ace are updated in place.
+    active = np.flatnonzero(self.hit[self.hand_ids(total,ace),upcard-1]&(total<=21))
+    while len(active)>0:
+      cards = self.deal(rounds[active])
+      total[active] += cards
+      ace[active] |= cards==1
+      keep = self.hit[self.hand_ids(total[active],ace[active]),upcard[active]-1]&(total[active]<=21)
+      active = active[keep]
+
+  def dealer_hits(self,total,ace):
+    # Dealers must hit until their score is above or equal to 17, and hit soft
+    # 17s under the H17 rule
+    scores = self.scores(total,ace)
+    hits = scores<17
+    if self.rules.hit_soft_17:
+      hits |= (scores==17)&ace&(total<=11)
+    return hits
+
+  def play_dealer(self,total,ace,rounds):
+    active = np.flatnonzero(self.dealer_hits(total,ace))
+    while len(active)>0:
+      cards = self.deal(rounds[active])
+      total[active] += cards
+      ace[active] |= cards==1
+      active = active[self.dealer_hits(total[active],ace[active])]
+
+  def simulate_rounds(self,n):
+    """
+    Plays n independent rounds.
+
+    Returns:
+        np.ndarray: The net result of each round in units of the initial bet.
+    """
+    rounds = np.arange(n)
+    card1, card2, upcard, hole = (self.deal(rounds) for _ in range(4))
+
+    player_natural = ((card1==1)&(card2==10))|((card1==10)&(card2==1))
+    dealer_natural = ((upcard==1)&(hole==10))|((upcard==10)&(hole==1))
+
+    # Each round has up to two hands due to splitting, stored in two rows.
+    total = np.zeros((2,n),dtype=np.int64)
+    ace = np.zeros((2,n),dtype=bool)
+    bet = np.zeros((2,n))
+    playing = ~player_natural&~dealer_natural
+
+    # Splitting. Pairs are indexed by their card value like the split matrix.
+    splits = playing&(card1==card2)
+    splits[splits] = self.split[card1[splits]-1,upcard[splits]-1]
+    idx = np.flatnonzero(splits)
+    for row in range(2):
+      card = self.deal(idx)
+      total[row,idx] = card1[idx]+card
+      ace[row,idx] = (card1[idx]==1)|(card==1)
+      bet[row,idx] = 1
+
+    # Everything else is a single hand
+    single = np.flatnonzero(playing&~splits)
+    total[0,single] = card1[single]+card2[single]
+    ace[0,single] = (card1[single]==1)|(card2[single]==1)
+    bet[0,single] = 1
+
+    for row in range(2):
+      hands = np.flatnonzero(bet[row]>0)
+      # When aces are split, only one more card may be drawn.
+      hands = hands[~(splits[hands]&(card1[hands]==1))]
+
+      doubles = self.dd[self.hand_ids(total[row,hands],ace[row,hands]),upcard[hands]-1]
+      if not self.rules.double_after_split:
+        doubles &= ~splits[hands]
+      idx = hands[doubles]
+      card = self.deal(idx)
+      total[row,idx] += card
+      ace[row,idx] |= card==1
+      bet[row,idx] = 2
+
+      idx = hands[~doubles]
+      t, a = total[row,idx], ace[row,idx]
+      self.play_hands(t,a,upcard[idx],idx)
+      total[row,idx], ace[row,idx] = t, a
+
+    # The dealer only plays if some hand didn't bust
+    dealer_total = upcard+hole
+    dealer_ace = (upcard==1)|(hole==1)
+    alive = np.flatnonzero(((bet>0)&(total<=21)).any(axis=0))
+    t, a = dealer_total[alive], dealer_ace[alive]
+    self.play_dealer(t,a,alive)
+    dealer_total[alive], dealer_ace[alive] = t, a
+
+    # Payout as in BlackjackGame.payout
+    player_score = self.scores(total,ace)
+    dealer_score = self.scores(dealer_total,dealer_ace)
+    lose = (player_score>21)|((player_score<dealer_score)&(dealer_score<=21))
+    draw = player_score==dealer_score
+    results = np.where(lose,-bet,np.where(draw,0,bet)).sum(axis=0)
+    results[player_natural] = self.rules.blackjack_payout
+    results[dealer_natural] = np.where(player_natural[dealer_natural],0,-1)
+    return results
+
+  def run(self,n_rounds,chunk=2**18,stats=None):
+    """
+    Plays n_rounds rounds, chunk rounds at a time.
+
+    Returns:
+        SimulationStats: The statistics of the results, added to stats if given.
+    """
+    if stats is None:
+      stats = SimulationStats()
+    for lo in range(0,n_rounds,chunk):
+      stats.add(self.simulate_rounds(min(chunk,n_rounds-lo)))
+    return stats
+
+def deal_shoes(n_shoes,n_decks,rng):
+  # The card values (1-10) of n_shoes shuffled shoes, in the order they're dealt
+  shoe = np.tile(np.repeat(np.arange(1,11,dtype=np.int8),[4]*9+[16]),n_decks)
+  return rng.permuted(np.broadcast_to(shoe,(n_shoes,len(shoe))),axis=1)
+
+class ShoeSimulation(BlackjackSimulation):
+  """
+  Plays rounds dealt from shuffled shoes rather than drawn with replacement.
+  Many shoes are dealt at once: every shoe plays one round at a time, all of
+  them as one batch of rounds of BlackjackSimulation, until its cut card is
+  reached. So every round is played with the cards the earlier rounds of its
+  shoe left.
+
+  Args:
+      hit, dd, split (np.ndarray): The boolean strategy matrices.
+      n_decks (int): The number of decks in a shoe.
+      penetration (float): The fraction of the shoe dealt before reshuffling.
+      seed, rules: As for BlackjackSimulation.
+  """
+  def __init__(self,hit,dd,split,n_decks=6,penetration=0.75,seed=None,rules=None):
+    super().__init__(hit,dd,split,seed=seed,rules=rules)
+    self.n_decks = n_decks
+    self.n_cards = 52*n_decks
+    self.cut = int(penetration*self.n_cards)
+
+  @classmethod
+  def from_strategy(cls,strategy,n_decks=6,penetration=0.75,seed=None,rules=None):
+    return cls(*strategy.arrays(),n_decks,penetration,seed,rules)
+
+  def deal(self,rounds):
+    # The next card of the shoe of each round. A round going past the end of
+    # its shoe, only possible with a cut card at the very end, is dealt the
+    # shoe's first cards again.
+    shoes = self.round_shoes[rounds]
+    cards = self.cards[shoes,self.cursor[shoes]%self.n_cards]
+    self.cursor[shoes] += 1
+    return cards
+
+  def play_shoes(self,n_shoes):
+    """
+    Shuffles n_shoes shoes and plays rounds from each until its cut card.
+
+    Returns:
+        dict: 'cards' the values (1-10) of every shoe's cards in the order
+        they're dealt, of shape (n_shoes, 52*n_decks), and of shape
+        (n_shoes, the most rounds of any shoe): 'starts' the number of cards
+        dealt before every round, 'results' its net result and 'played'
+        whether the shoe had that round, since shoes reach their cut cards
+        after different numbers of rounds. Rounds which weren't played start
+        at 0 and have a result of 0. 'n_dealt' is the number of cards dealt
+        from each shoe.
+    """
+    self.cards = deal_shoes(n_shoes,self.n_decks,self.rng)
+    self.cursor = np.zeros(n_shoes,dtype=np.int64)
+    starts, results = [], []
+    active = np.arange(n_shoes)
+    while len(active)>0:
+      self.round_shoes = active
+      start = np.full(n_shoes,-1)
+      start[active] = self.cursor[active]
+      result = np.zeros(n_shoes)
+      result[active] = self.simulate_rounds(len(active))
+      starts.append(start)
+      results.append(result)
+      active = active[self.cursor[active]<self.cut]
+    starts = np.stack(starts,axis=1)
+    return {'cards':self.cards,'starts':np.maximum(starts,0),'results':np.stack(results,axis=1),
+            'played':starts>=0,'n_dealt':self.cursor.copy()}
+
+def _run_shard(args):
+  hit, dd, split, card_probs, seed, n_rounds = args
+  return BlackjackSimulation(hit,dd,split,card_probs,seed).run(n_rounds).histogram
+
+def run_sharded(hit,dd,split,n_rounds,card_probs=None,seed=0,shard_size=2**20,processes=None):
+  """
+  Plays n_rounds rounds split into shards over a process pool.
+
+  The rounds are always split into the same shards of shard_size rounds, and
+  each shard gets its own random stream spawned from seed. Since the histograms
+  are merged exactly, the result for a given seed is the same no matter how
+  many processes ran the shards.
+
+  Args:
+      hit, dd, split (np.ndarray): The boolean strategy matrices.
+      n_rounds (int): The number of rounds to play.
+      card_probs (np.ndarray, optional): The probabilities of the card values.
+      seed (int): The seed all the shards' random streams are spawned from.
+      shard_size (int): The number of rounds in each shard.
+      processes (int, optional): The number of worker processes. Defaults to
+          the number of cpus. With 1 everything runs in this process.
+
+  Returns:
+      SimulationStats: The merged statistics of all the rounds.
+  """
+  sizes = [min(shard_size,n_rounds-lo) for lo in range(0,n_rounds,shard_size)]
+  seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+  shards = [(hit,dd,split,card_probs,s,size) for s,size in zip(seeds,sizes)]
+  processes = processes or os.cpu_count()
+  if processes==1:
+    histograms = list(map(_run_shard,shards))
+  else:
+    with ProcessPoolExecutor(processes) as pool:
+      histograms = list(pool.map(_run_shard,shards))
+  return SimulationStats(np.sum(histograms,axis=0,dtype=np.int64))
+
+if __name__ == '__main__':
+  from BlackjackAnalysis import BlackjackAnalysis
+  bl = BlackjackAnalysis()
+  bl.compute()
+  print(run_sharded(*bl.strategyArrays(),10**7,card_probs=bl.probs_array()))
+  print(f"Analysis: EV = {bl.EV:.6f}, V = {bl.V:.6f}")
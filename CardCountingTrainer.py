@@ -1,36 +1,38 @@
-from modules.Deck import Deck
+from modules.Shoe import Shoe
+from modules.Count import RunningCounts
 from modules.utilities import get_integer
-from BlackjackAnalysis import BlackjackAnalysis
-from ComputeEffectOfRemoval import export_EORs
+from modules import cache
 
-import pandas as pd
-import os
+def count_tags():
+  # The count of each card value (1-10) from modules.cache. They're only
+  # computed (importing pandas) if they haven't been cached yet.
+  return {value:int(tag) for value,tag in zip(range(1,11),cache.count_tags()['tags'])}
 
-# Check if the files exist, otherwise say they don't exist and exit.
-if (os.path.exists('effect_of_removals.csv') and
-    os.path.exists('EV.csv')):
-  EORs = pd.read_csv('effect_of_removals.csv',index_col='card_value')
-  EV = pd.read_csv('EV.csv',index_col=0).values[0][0]
-  EORs = EORs.iloc[:,0]
-  HILO = (-EORs/EV).round().astype(int)
-else:
-    pass
+def tags_str(tags):
+  return '\n'.join(f"{'A' if value==1 else value}: {tag:+d}" for value,tag in tags.items())
 
 
 class CardCountTrainer:
   def __init__(self):
+    self.tags = count_tags()
     self.n_turns = 0
     self.n_correct = 0
 
-    self.deck = Deck()
-    self.count = 0
+    # The count is kept by following the shoe's draws, from 0 after every shuffle
+    self.deck = Shoe()
+    self.counts = RunningCounts({'count':self.tags},self.deck,reset_on_shuffle=True)
 
   def reset(self):
     self.n_turns = 0
     self.n_correct = 0
 
-    self.deck = Deck()
-    self.count = 0
+    self.deck = Shoe()
+    self.counts.attach(self.deck)
+    self.counts.reset()
+
+  @property
+  def count(self):
+    return int(self.counts['count'])
 
   def print_performance(self):
     print(f"You got {self.n_correct} correct out of {self.n_turns}")
@@ -41,16 +43,15 @@ class CardCountTrainer:
 
   def play_game(self, n_cards = 4):
     print("The HILO count is used here:")
-    print(HILO)
+    print(tags_str(self.tags))
     while True:
-      if len(self.deck.cards)<n_cards:
+      if len(self.deck)<n_cards:
         self.deck.reshuffle_deck()
       print(self.deck.summary())
       print(f"The current count is {self.count}")
       cards = self.deck.draw_cards(n_cards)
       for card in cards:
         print(str(card))
-        self.count += HILO[card.value]
 
       value = self.get_player_count()
       if value == 'exit':
@@ -66,23 +67,5 @@ class CardCountTrainer:
     self.print_performance()
 
 if __name__ == '__main__':
-  if (os.path.exists('effect_of_removals.csv') and
-      os.path.exists('EV.csv')):
-    pass
-  else:
-    print("Necessary files do not exist. Will compute them.")
-    bl1 = BlackjackAnalysis()
-    bl1.compute()
-    bl1.exportEV()
-    bl1.exportStrategy()
-    bl1.exportResults
-
-    export_EORs()
-
-    EORs = pd.read_csv('effect_of_removals.csv',index_col='card_value')
-    EV = pd.read_csv('EV.csv',index_col=0).values[0][0]
-    EORs = EORs.iloc[:,0]
-    HILO = (-EORs/EV).round().astype(int)
-
-cct = CardCountTrainer()
-cct.play_game()
+  cct = CardCountTrainer()
+  cct.play_game()
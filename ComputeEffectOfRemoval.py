@@ -1,20 +1,140 @@
-from BlackjackAnalysis import BlackjackAnalysis
+from modules import engine
+from modules import cache
+from concurrent.futures import ProcessPoolExecutor
 import os
+import numpy as np
 import pandas as pd
 
 
-def compute_EORs():
-  EORs = pd.Series(dtype=float)
-  EORs.index.name = 'card_value'
-  EV = pd.read_csv('EV.csv',index_col=0).values[0][0]
-  for i in range(10):
-    print(i+1)
-    card_probs = {k:v for k,v in zip([1+x for x in range(10)],[4/51]*9+[16/51])}
-    card_probs[i+1]-=1/51
-    bl = BlackjackAnalysis(card_probs)
-    bl.importStrategy()
-    bl.compute(computeStrategy=False)
-    EORs[i+1]=bl.EV-EV
+def shoe_counts(n_decks=1,card_probs=None):
+  # The number of cards of each value Ace,2,...,9,Face card in a shoe of n_decks
+  # decks, in the proportions card_probs if given (so not always whole numbers)
+  if card_probs is None:
+    return n_decks*np.array([4]*9+[16])
+  card_probs = np.asarray(card_probs,dtype=float)
+  return 52*n_decks*card_probs/card_probs.sum()
+
+def perturbed_probs(n_decks=1,n_changed=-1,card_probs=None):
+  # card probabilities of a shoe with n_changed cards of each value added
+  # (or removed if negative), one composition per card value
+  counts = shoe_counts(n_decks,card_probs)+n_changed*np.eye(10)
+  assert (counts>=0).all(), "Can't remove more cards than the shoe has"
+  return counts/counts.sum(axis=1,keepdims=True)
+
+def composition_strategy(card_probs=None,rules=None):
+  # The hit, double down and split matrices of the strategy for the shoe of
+  # card_probs under rules, see modules.cache.analysis
+  a = cache.analysis(card_probs,rules)
+  return (a['hit_matrix'],a['dd_matrix'],a['split_matrix'])
+
+def _solve_EVs(args):
+  card_probs, hit, dd, split, rules = args
+  return engine.solve_batch(card_probs,hit,dd,split,rules=rules,variance=False)['EV']
+
+def solve_EVs(card_probs,strategy,processes=None,rules=None):
+  """
+  Computes the EV of each composition following a fixed strategy, fanning
+  the compositions out over a process pool.
+
+  Args:
+      card_probs (np.ndarray): The compositions, of shape (N, 10).
+      strategy (tuple): The hit, double down and split matrices as arrays.
+      processes (int, optional): The number of worker processes. Defaults to
+          the number of cpus. With 1 everything runs in this process.
+      rules (Rules, optional): The table rules.
+
+  Returns:
+      np.ndarray: The EVs in the same order as card_probs.
+  """
+  processes = processes or os.cpu_count()
+  chunks = [(x,)+tuple(strategy)+(rules,) for x in np.array_split(card_probs,min(processes,len(card_probs)))]
+  if processes==1:
+    results = map(_solve_EVs,chunks)
+  else:
+    # map keeps the order of the chunks, so results don't depend on which
+    # worker finished first
+    with ProcessPoolExecutor(processes) as pool:
+      results = list(pool.map(_solve_EVs,chunks))
+  return np.concatenate(list(results))
+
+def compute_EOR_table(decks=(1,),removals=(1,),symmetric=False,strategy=None,processes=None,rules=None,
+                      card_probs=None):
+  """
+  Computes effect of removals for several shoe sizes and removal depths at once.
+
+  Args:
+      decks (iterable): The numbers of decks in the shoe.
+      removals (iterable): The numbers of cards of a value to remove.
+      symmetric (bool): If True, the EOR is the symmetric estimate
+          (EV with k removed - EV with k added)/(2k) instead of (EV with k removed - EV)/k.
+      strategy (tuple, optional): The hit, double down and split matrices as arrays.
+          Defaults to the strategy of the composition card_probs under rules,
+          see modules.cache.
+      processes (int, optional): The number of worker processes.
+      rules (Rules, optional): The table rules.
+      card_probs (np.ndarray, optional): The composition of the shoe cards are
+          removed from, the probabilities of Ace,2,...,9,Face card. A shoe of
+          n_decks decks has 52*n_decks cards in these proportions. Defaults to
+          a standard shoe.
+
+  Returns:
+      pd.DataFrame: The EOR per card removed, indexed by card value with a
+      column for each (n_decks, n_removed).
+  """
+  if strategy is None:
+    strategy = composition_strategy(card_probs,rules)
+
+  configs = [(n_decks,k) for n_decks in decks for k in removals]
+  # All compositions are stacked into one array: the full shoe first and then
+  # 10 compositions per configuration (or 20 if symmetric).
+  full = shoe_counts(1,card_probs)
+  compositions = [full[None]/full.sum()]
+  for n_decks,k in configs:
+    compositions.append(perturbed_probs(n_decks,-k,card_probs))
+    if symmetric:
+      compositions.append(perturbed_probs(n_decks,k,card_probs))
+  EVs = solve_EVs(np.concatenate(compositions),strategy,processes,rules)
+
+  EV = EVs[0]
+  EVs = EVs[1:].reshape(len(configs),2 if symmetric else 1,10)
+  EORs = pd.DataFrame(index=pd.Index(range(1,11),name='card_value'),
+                      columns=pd.MultiIndex.from_tuples(configs,names=['n_decks','n_removed']),
+                      dtype=float)
+  for (n_decks,k),EV_k in zip(configs,EVs):
+    if symmetric:
+      EORs[(n_decks,k)] = (EV_k[0]-EV_k[1])/(2*k)
+    else:
+      EORs[(n_decks,k)] = (EV_k[0]-EV)/k
+  return EORs
+
+def gradient_EOR_table(decks=(1,),removals=(1,),strategy=None,rules=None,card_probs=None):
+  """
+  Estimates effect of removals from the gradient of EV with respect to the card
+  probabilities instead of re-solving each composition. This is the first order
+  approximation (EV_grad.dp)/k where dp is the change in card probabilities from
+  removing k cards of a value from the shoe of card_probs, see compute_EOR_table.
+
+  Returns:
+      pd.DataFrame: Laid out the same as compute_EOR_table.
+  """
+  if strategy is None:
+    strategy = composition_strategy(card_probs,rules)
+
+  full = shoe_counts(1,card_probs)
+  p0 = full/full.sum()
+  EV_grad = engine.solve_gradient(p0,*strategy,rules)['EV_grad']
+  configs = [(n_decks,k) for n_decks in decks for k in removals]
+  EORs = pd.DataFrame(index=pd.Index(range(1,11),name='card_value'),
+                      columns=pd.MultiIndex.from_tuples(configs,names=['n_decks','n_removed']),
+                      dtype=float)
+  for n_decks,k in configs:
+    EORs[(n_decks,k)] = (perturbed_probs(n_decks,-k,card_probs)-p0)@EV_grad/k
+  return EORs
+
+def compute_EORs(n_decks=1,n_removed=1,symmetric=False,processes=None):
+  # Only computed if they aren't in modules.cache already
+  EORs = pd.Series(cache.EORs(n_decks,n_removed,symmetric,processes=processes)['EOR'],
+                   index=pd.Index(range(1,11),name='card_value'))
   print(EORs)
   return EORs
 
@@ -28,21 +148,6 @@ def export_EORs():
 
 if __name__=='__main__':
   print("Computing effect of removals.")
-  if (os.path.exists('EV.csv') and 
-    os.path.exists('hit_matrix.csv') and
-    os.path.exists('dd_matrix.csv') and
-    os.path.exists('split_matrix.csv')):
-    pass
-  else:
-      print("Necessary files do not exist. Will compute them.")
-      bl1 = BlackjackAnalysis()
-      print("Computing analysis of Blackjack.")
-      bl1.compute()
-      print("Saving analysis of Blackjack.")
-      bl1.exportStrategy()
-      bl1.exportEV()
-      bl1.exportResults()
-
   export_EORs()
 
 
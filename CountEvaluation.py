@@ -0,0 +1,361 @@
+from modules import engine
+from modules import cache
+from modules import distributions
+from modules.Count import COUNT_SYSTEMS
+from modules.Rules import Rules
+from modules.Strategy import CompiledStrategy
+from BlackjackSimulation import ShoeSimulation, deal_shoes
+from math import erf, sqrt
+import numpy as np
+import pandas as pd
+
+# Measures how good a card counting system is, given its tags of the card
+# values Ace,2,...,9,Face card. Tags are arrays of shape (10,), or (K, 10) to
+# evaluate K systems at once, and every measure is vectorized over them.
+#
+# The betting correlation and playing efficiency compare the tags with how
+# removing cards changes the EV and the decisions, both over the 13 ranks,
+# i.e. weighting the card values by their probabilities. The win rate is
+# simulated: shuffled shoes are dealt and their rounds played out card by card
+# with basic strategy until the cut card (PlayedShoeSample), betting by the
+# true count before each round. LinearEVShoeSample is a much faster estimator
+# which draws each round's result from the EV of the remaining cards instead.
+
+DEFAULT_CARD_PROBS = np.array([4/52]*9+[16/52])
+
+def tag_array(tags):
+  # tags as a dict of card value (1-10) to tag, or an array indexed by card value-1
+  if isinstance(tags,dict):
+    return np.array([tags[value] for value in range(1,11)],dtype=float)
+  return np.asarray(tags,dtype=float)
+
+def weighted_correlation(x,y,w):
+  """
+  The correlation of x and y over their last axes, with weights w, broadcast
+  over the leading axes.
+  """
+  w = w/w.sum()
+  x = x-(x*w).sum(axis=-1,keepdims=True)
+  y = y-(y*w).sum(axis=-1,keepdims=True)
+  return (x*y*w).sum(axis=-1)/np.sqrt((x*x*w).sum(axis=-1)*(y*y*w).sum(axis=-1))
+
+def betting_correlation(tags,EOR=None,card_probs=None,rules=None):
+  """
+  The correlation of the tags with the effects of removal, i.e. how well the
+  count tracks the player's advantage. EOR defaults to the EORs of removing
+  cards from a single deck of the composition card_probs, from modules.cache.
+  """
+  if EOR is None:
+    EOR = cache.EORs(card_probs=card_probs,rules=rules)['EOR']
+  w = DEFAULT_CARD_PROBS if card_probs is None else np.asarray(card_probs,dtype=float)
+  return weighted_correlation(tag_array(tags),np.asarray(EOR,dtype=float),w)
+
+def _normal_cdf(x):
+  return 0.5*(1+np.vectorize(erf)(x/sqrt(2)))
+
+def decision_gradients(card_probs=None,rules=None,n_decks=1):
+  """
+  Finds how the starting decisions of basic strategy change with the composition.
+
+  Every decision (hitting or holding, doubling down or not and splitting or
+  not, for every two card hand and upcard) has a gain, the EV of the first
+  choice less the second when the rest of the round follows basic strategy,
+  and the gain's gradient with respect to the card probabilities (by complex
+  step, see engine.solve_gradient).
+
+  A count can only vary a decision by how well it tracks that gradient. The
+  decisions are weighted by how much varying them could gain: how often
+  they're reached, times E(max(0,X)) where X is the gain after removing half
+  of a shoe of n_decks decks, approximated as normal.
+
+  Returns:
+      dict: 'gain' (D,), the EV of the first choice less the second, 'grad'
+      (D, 10) its gradient and 'weight' (D,).
+  """
+  rules = rules if rules is not None else Rules()
+  p0 = DEFAULT_CARD_PROBS if card_probs is None else np.asarray(card_probs,dtype=float)
+  r0 = engine.solve_stages(p0[None],rules=rules,dense=False,variance=False)
+  strategy = [r0[k][0] for k in ['hit_matrix','dd_matrix','split_matrix']]
+  perturbed = p0+1j*engine.COMPLEX_STEP*np.eye(10)
+  r = engine.solve_stages(perturbed,*strategy,rules,dense=False,variance=False)
+
+  # The gains of hitting (and playing on) over holding, doubling down over
+  # not, and splitting over not
+  E_next = engine.expected_hit(perturbed,r['X_M'])[:,0]
+  gains = [E_next-r['E_hold'],r['E_dd']-r['E_M'],r['E_split']-r['E_nosplit']]
+
+  # How often each decision is reached, given the dealer has no natural
+  natural_prob,hole_pair_probs,hole_hand_probs = engine.hole_probs(p0[None])
+  upcard = p0*(1-engine.dealer_natural_probs(p0[None])[0])
+  hand_freq = hole_hand_probs[0][:,None]*upcard
+  hand_freq[engine.PAIR_IDS] = hole_pair_probs[0][:,None]*upcard*~strategy[2]
+  pair_freq = hole_pair_probs[0][:,None]*upcard
+  can_double = rules.can_double(engine.SCORES)[:,None]
+  freqs = [hand_freq,hand_freq*can_double,pair_freq]
+
+  gain = np.concatenate([g[0].real.ravel() for g in gains])
+  grad = np.concatenate([(g.imag/engine.COMPLEX_STEP).reshape(10,-1).T for g in gains])
+  freq = np.concatenate([f.ravel() for f in freqs])
+  keep = freq>0
+  gain, grad, freq = gain[keep], grad[keep], freq[keep]
+
+  # The standard deviation of grad.dp after removing m of N cards, sampling
+  # without replacement
+  N = 52*n_decks
+  m = N//2
+  centered = grad-(grad@p0)[:,None]
+  sd = np.sqrt(m/((N-1)*(N-m))*(centered**2@p0))
+  z = np.abs(gain)/np.maximum(sd,1e-300)
+  expected_gain = sd*np.exp(-z**2/2)/sqrt(2*np.pi)-np.abs(gain)*_normal_cdf(-z)
+  return {'gain':gain,'grad':grad,'weight':freq*expected_gain}
+
+def playing_efficiency(tags,decisions=None,card_probs=None,rules=None):
+  """
+  The weighted average, over the decisions of decision_gradients, of how well
+  the tags correlate with each decision's gradient (in either direction,
+  since a decision can be varied either way with the count). 1 for a count
+  tracking every decision perfectly.
+  """
+  if decisions is None:
+    decisions = decision_gradients(card_probs,rules)
+  w = DEFAULT_CARD_PROBS if card_probs is None else np.asarray(card_probs,dtype=float)
+  tags = tag_array(tags)
+  rho = weighted_correlation(tags[...,None,:],decisions['grad'],w)
+  return np.abs(rho)@decisions['weight']/decisions['weight'].sum()
+
+class BetRamp:
+  """
+  Bets by true count: bets[0] below thresholds[0], bets[i] from thresholds[i-1]
+  up to thresholds[i], and bets[-1] from thresholds[-1] up.
+  """
+  def __init__(self,thresholds=(1,2,3,4),bets=(1,2,4,6,8)):
+    assert len(bets)==len(thresholds)+1, "There must be one more bet than thresholds"
+    self.thresholds = np.asarray(thresholds,dtype=float)
+    self.bets = np.asarray(bets,dtype=float)
+
+  def __call__(self,true_counts):
+    return self.bets[np.searchsorted(self.thresholds,true_counts,side='right')]
+
+  def __str__(self):
+    return ', '.join([f"{self.bets[0]:g} below {self.thresholds[0]:g}"]+
+                     [f"{b:g} from {t:g}" for t,b in zip(self.thresholds,self.bets[1:])])
+
+def round_starts(n_decks,penetration,cards_per_round):
+  # The number of cards dealt before each round of a shoe at fixed depths,
+  # rounds being dealt until the cut card is reached
+  n_rounds = int(np.ceil(penetration*52*n_decks/cards_per_round))
+  return np.floor(np.arange(n_rounds)*cards_per_round).astype(np.int64)
+
+def dealt_counts(cards,starts):
+  # The number of cards of each value dealt before each round, of shape
+  # (n_shoes, rounds per shoe, 10), from the shoes' cards and the number of
+  # cards dealt before each round, of shape (rounds per shoe,) or (n_shoes, rounds per shoe)
+  n_shoes = len(cards)
+  dealt = np.cumsum(cards[...,None]==np.arange(1,11,dtype=np.int8),axis=1,dtype=np.int16)
+  dealt = np.concatenate([np.zeros((n_shoes,1,10),dtype=np.int16),dealt],axis=1)
+  starts = np.broadcast_to(starts,(n_shoes,np.shape(starts)[-1]))
+  return np.take_along_axis(dealt,starts[...,None],axis=1)
+
+class ShoeSample:
+  """
+  The rounds of shoes dealt once, with the number of cards of each value dealt
+  before every round and the result of the round per unit bet, so counting
+  systems and bet ramps can be evaluated on the same rounds. Any count is then
+  a product with those numbers, however many systems are evaluated.
+
+  Subclasses set 'dealt' (n_shoes, rounds per shoe, 10), 'starts' the number
+  of cards dealt before every round, 'results' and 'played' whether the shoe
+  had that round (of shape (n_shoes, rounds per shoe)), and 'cards_per_round'.
+  """
+  def true_counts(self,tags):
+    """
+    The true count (running count per deck remaining) before every round, of
+    shape tags.shape[:-1]+(n_shoes, rounds per shoe). The running count of an
+    unbalanced system is taken relative to its expected value at that depth,
+    which is the usual conversion of such a count to a true count.
+    """
+    tags = tag_array(tags)
+    running = np.einsum('srv,...v->...sr',self.dealt,tags)
+    running -= (tags@DEFAULT_CARD_PROBS)[...,None,None]*self.starts
+    decks_remaining = (self.n_cards-self.starts)/52
+    return running/decks_remaining
+
+  def totals(self,bets):
+    """
+    The sums over every round played of the amount won, its square and the
+    bet, betting bets (of the shape of the results, with any leading axes).
+    Totals of separate samples add up, see summarize.
+    """
+    bets = bets*self.played
+    won = bets*self.results
+    return np.stack([won.sum(axis=(-2,-1)),(won**2).sum(axis=(-2,-1)),
+                     bets.sum(axis=(-2,-1)),np.full(won.shape[:-2],self.played.sum())])
+
+class PlayedShoeSample(ShoeSample):
+  """
+  Deals shoes and plays their rounds out card by card with a strategy, by
+  BlackjackSimulation.ShoeSimulation, so every round is played with the cards
+  the earlier rounds of its shoe left, until the cut card.
+
+  Args:
+      n_shoes (int): The number of shoes to deal.
+      n_decks (int): The number of decks in a shoe.
+      penetration (float): The fraction of the shoe dealt before reshuffling.
+      rules (Rules, optional): The table rules. Defaults to Rules().
+      strategy (CompiledStrategy, optional): The strategy played. Defaults to
+          basic strategy for the rules, from modules.cache.
+      seed (int, optional): Seeds the random generator for reproducible results.
+  """
+  def __init__(self,n_shoes=10**4,n_decks=6,penetration=0.75,rules=None,strategy=None,seed=None):
+    self.rules = rules if rules is not None else Rules()
+    self.n_decks = n_decks
+    self.n_cards = 52*n_decks
+    strategy = strategy if strategy is not None else CompiledStrategy.from_cache(rules=self.rules)
+    shoes = ShoeSimulation.from_strategy(strategy,n_decks,penetration,seed,self.rules).play_shoes(n_shoes)
+    self.starts = shoes['starts']
+    self.results = shoes['results']
+    self.played = shoes['played']
+    self.dealt = dealt_counts(shoes['cards'],self.starts)
+    self.cards_per_round = shoes['n_dealt'].sum()/self.played.sum()
+
+class LinearEVShoeSample(ShoeSample):
+  """
+  The fast estimator: rounds at fixed depths, every cards_per_round cards
+  whatever is played, with results drawn from the exact outcome distribution
+  of the full shoe shifted by the EV of the remaining cards. That EV is the
+  first order estimate of ShoeTracker, EV_grad.p, so like the EORs it assumes
+  basic strategy is played throughout. It needs no strategy play at all, but
+  misses how the rounds change the cards of the next ones.
+
+  Args:
+      cards_per_round (float): The average number of cards used by a round,
+          about 5.4 heads up.
+      The rest are as for PlayedShoeSample.
+  """
+  def __init__(self,n_shoes=10**4,n_decks=6,penetration=0.75,cards_per_round=5.4,
+               rules=None,seed=None):
+    self.rules = rules if rules is not None else Rules()
+    self.n_decks = n_decks
+    self.cards_per_round = cards_per_round
+    self.rng = np.random.default_rng(seed)
+    self.starts = round_starts(n_decks,penetration,cards_per_round)
+    self.n_cards = 52*n_decks
+    self.dealt = dealt_counts(deal_shoes(n_shoes,n_decks,self.rng),self.starts)
+    self.played = np.ones(self.dealt.shape[:2],dtype=bool)
+
+    p0 = DEFAULT_CARD_PROBS
+    d = distributions.solve_distribution(p0,rules=self.rules)
+    r = engine.solve(p0,rules=self.rules,variance=False)
+    EV_grad = engine.solve_gradient(p0,r['hit_matrix'],r['dd_matrix'],r['split_matrix'],self.rules)['EV_grad']
+    # The EV of the remaining cards before each round, EV_grad.p, with p the
+    # remaining counts over the number of cards remaining
+    remaining = self.n_cards-self.starts
+    counts = self.n_cards*p0
+    self.EV = d['EV']+((EV_grad@counts-self.dealt@EV_grad)/remaining-EV_grad@p0)
+
+    # Every round's result is the full shoe's outcome shifted to its EV
+    idx = np.searchsorted(np.cumsum(d['pmf']),self.rng.random(self.EV.shape),side='right')
+    self.results = d['values'][np.minimum(idx,len(d['values'])-1)]+self.EV-d['EV']
+
+def shoe_samples(n_shoes=10**4,n_decks=6,penetration=0.75,rules=None,seed=0,chunk=2**12,
+                 fast=False,cards_per_round=5.4):
+  # The ShoeSamples of n_shoes shoes, chunk shoes at a time, each with its own
+  # random stream spawned from seed. They're played out unless fast, when
+  # they're LinearEVShoeSamples at cards_per_round.
+  seeds = np.random.SeedSequence(seed).spawn(int(np.ceil(n_shoes/chunk)))
+  for i,s in enumerate(seeds):
+    size = min(chunk,n_shoes-i*chunk)
+    if fast:
+      yield LinearEVShoeSample(size,n_decks,penetration,cards_per_round,rules,s)
+    else:
+      yield PlayedShoeSample(size,n_decks,penetration,rules,seed=s)
+
+def summarize(totals,rounds_per_hour=100):
+  """
+  The win rate from ShoeSample.totals.
+
+  Returns:
+      dict: 'win_rate' and 'sd' per round, 'win_per_hour' and 'sd_per_hour',
+      'se_per_hour' the standard error of win_per_hour, and 'average_bet',
+      all in units.
+  """
+  won, won2, bet, n = totals
+  mean = won/n
+  sd = np.sqrt(won2/n-mean**2)
+  return {'win_rate':mean,'sd':sd,'win_per_hour':rounds_per_hour*mean,
+          'sd_per_hour':np.sqrt(rounds_per_hour)*sd,'se_per_hour':rounds_per_hour*sd/np.sqrt(n),
+          'average_bet':bet/n}
+
+def simulate_totals(tags,ramps,n_shoes=10**4,n_decks=6,penetration=0.75,rules=None,seed=0,
+                    chunk=2**12,batch=16,fast=False,cards_per_round=5.4):
+  """
+  Bets by the true counts of several systems over the same shoes (see
+  shoe_samples), chunk shoes and batch systems at a time so memory stays
+  bounded.
+
+  Args:
+      tags (np.ndarray): The tags of the systems, of shape (K, 10).
+      ramps (BetRamp or list): The bets by true count of every system, or a
+          list of one per system.
+      fast (bool): Whether to use the fast estimator LinearEVShoeSample at
+          cards_per_round rather than playing the rounds out.
+      The rest are as for PlayedShoeSample.
+
+  Returns:
+      tuple: The totals of every system (see ShoeSample.totals), of shape
+      (4, K), and the average number of cards per round.
+  """
+  tags = tag_array(tags)
+  ramps = ramps if isinstance(ramps,(list,tuple)) else [ramps]*len(tags)
+  totals, n_dealt = 0, 0
+  for sample in shoe_samples(n_shoes,n_decks,penetration,rules,seed,chunk,fast,cards_per_round):
+    sums = []
+    for lo in range(0,len(tags),batch):
+      true_counts = sample.true_counts(tags[lo:lo+batch])
+      sums.append(sample.totals(np.stack([ramp(tc) for ramp,tc in zip(ramps[lo:lo+batch],true_counts)])))
+    totals = totals+np.concatenate(sums,axis=1)
+    n_dealt += sample.cards_per_round*sample.played.sum()
+  return totals, n_dealt/totals[3,0]
+
+def evaluate_systems(systems=None,ramp=None,n_shoes=10**4,n_decks=6,penetration=0.75,
+                     rounds_per_hour=100,rules=None,seed=0,chunk=2**12,fast=False,cards_per_round=5.4):
+  """
+  Evaluates counting systems side by side: the betting correlation, playing
+  efficiency and the win rate of betting by each system's true count over the
+  same played out shoes (see PlayedShoeSample), chunk shoes at a time.
+
+  Args:
+      systems (dict, optional): Names of systems to their tags. Defaults to
+          modules.Count.COUNT_SYSTEMS.
+      ramp (BetRamp or dict, optional): The bets by true count, or a dict of
+          each system's name to its own, since the true counts of higher level
+          systems are on a larger scale. Defaults to BetRamp().
+      fast (bool): Whether to estimate the win rates with LinearEVShoeSample
+          at cards_per_round instead.
+      The rest are as for PlayedShoeSample.
+
+  Returns:
+      pd.DataFrame: The measures of every system, with the average number of
+      cards per round of the shoes.
+  """
+  if systems is None:
+    systems = COUNT_SYSTEMS
+  ramp = ramp if ramp is not None else BetRamp()
+  ramps = ramp if isinstance(ramp,dict) else {name:ramp for name in systems}
+  tags = np.stack([tag_array(t) for t in systems.values()])
+  table = pd.DataFrame({'betting_correlation':betting_correlation(tags,rules=rules),
+                        'playing_efficiency':playing_efficiency(tags,decision_gradients(rules=rules,n_decks=n_decks))},
+                       index=pd.Index(list(systems),name='system'))
+
+  totals, cards_per_round = simulate_totals(tags,[ramps[name] for name in systems],n_shoes,n_decks,
+                                            penetration,rules,seed,chunk,fast=fast,
+                                            cards_per_round=cards_per_round)
+  summary = summarize(totals,rounds_per_hour)
+  for key in ['average_bet','win_rate','win_per_hour','sd_per_hour','se_per_hour']:
+    table[key] = summary[key]
+  table['cards_per_round'] = cards_per_round
+  return table
+
+if __name__ == '__main__':
+  with pd.option_context('display.width',120):
+    print(evaluate_systems(n_shoes=10**5))
@@ -0,0 +1,160 @@
+from CountEvaluation import (DEFAULT_CARD_PROBS, BetRamp, simulate_totals, summarize, tag_array,
+                             weighted_correlation, betting_correlation, decision_gradients,
+                             playing_efficiency)
+from modules import cache
+from modules.Count import COUNT_SYSTEMS
+import numpy as np
+import pandas as pd
+
+# Searches for the best integer counting systems. A level L system has tags in
+# -L,...,L with at least one of +-L. Candidates are enumerated in batches and
+# scored by their betting correlation with the EORs, which is one weighted
+# product per candidate, so millions are scored in seconds. The search space
+# is pruned as it's enumerated:
+# - Only balanced systems (summing to 0 over a deck) are kept. Given the tags
+#   of Ace,...,9, the balanced Face card tag is fixed, so it isn't enumerated.
+# - A system and its negation count the same, and a system whose tags share a
+#   factor is a lower level system scaled up, so only one of each is kept: the
+#   5, which has the largest effect of removal, has a positive tag and the tags
+#   have no common factor.
+# Only the best by betting correlation are kept for scoring by playing
+# efficiency, and the best of those are simulated, all on the same shoes.
+#
+# With an ace side count, aces are tagged 0 and counted separately. The
+# betting count is then the main count plus the multiple of the ace surplus
+# which correlates best with the EORs, see side_count_tags.
+
+# The number of cards of each value Ace,2,...,9,Face card in a deck
+DECK = np.array([4]*9+[16])
+# The index of the 5
+FIVE = 4
+
+def tag_sd(tags):
+  # The standard deviation of the tags over the 13 ranks
+  tags = tag_array(tags)
+  return np.sqrt(((tags-(tags@DEFAULT_CARD_PROBS)[...,None])**2)@DEFAULT_CARD_PROBS)
+
+def candidate_tags(level,ace_side_count=False,batch=2**20):
+  """
+  Yields batches of the balanced level level tags, of shape (B, 10), pruned as
+  above. With an ace side count the ace's tag is 0.
+  """
+  values = np.arange(-level,level+1)
+  free = [i for i in range(9) if not (ace_side_count and i==0)]
+  # the 5 is positive, the other free tags take any value
+  sizes = np.array([level if i==FIVE else len(values) for i in free])
+  total = int(np.prod(sizes))
+  for lo in range(0,total,batch):
+    idx = np.arange(lo,min(total,lo+batch))
+    tags = np.zeros((len(idx),10),dtype=np.int64)
+    for i,size in zip(free,sizes):
+      digit = idx%size
+      idx = idx//size
+      tags[:,i] = digit+1 if i==FIVE else values[digit]
+    # Balanced: 4*(sum of the others)+16*face = 0
+    rest = tags[:,:9]@DECK[:9]
+    tags[:,9] = -rest//16
+    keep = (rest%16==0)&(np.abs(tags[:,9])<=level)
+    tags = tags[keep]
+    keep = (np.abs(tags).max(axis=1)==level)&(np.gcd.reduce(tags,axis=1)==1)
+    yield tags[keep]
+
+def side_count_tags(tags,EOR,w=DEFAULT_CARD_PROBS):
+  """
+  The betting tags of systems with an ace side count: the tags plus the
+  multiple of the ace's indicator which correlates best with EOR.
+  """
+  tags = tag_array(tags)
+  ace = np.zeros(10)
+  ace[0] = 1
+  w = w/w.sum()
+  # Least squares of EOR on the tags and the ace, with weights w, gives the
+  # best linear combination, which is then scaled back to the tags
+  X = np.stack(np.broadcast_arrays(tags,ace),axis=-1)
+  X = X-np.einsum('v,...vk->...k',w,X)[...,None,:]
+  y = EOR-w@EOR
+  A = np.einsum('...vk,v,...vl->...kl',X,w,X)
+  b = np.einsum('...vk,v,v->...k',X,w,y)
+  beta = np.linalg.solve(A+1e-12*np.eye(2),b[...,None])[...,0]
+  return tags+(beta[...,1]/beta[...,0])[...,None]*ace
+
+def top_betting_correlation(level,ace_side_count=False,n_keep=1000,EOR=None,rules=None):
+  """
+  Enumerates the candidates of a level and keeps the n_keep with the highest
+  betting correlation.
+
+  Returns:
+      tuple: The tags (n_keep, 10) and their betting correlations, best first.
+  """
+  if EOR is None:
+    EOR = cache.EORs(rules=rules)['EOR']
+  best_tags = np.zeros((0,10),dtype=np.int64)
+  best = np.zeros(0)
+  for tags in candidate_tags(level,ace_side_count):
+    betting = side_count_tags(tags,EOR) if ace_side_count else tags
+    bc = weighted_correlation(betting,EOR,DEFAULT_CARD_PROBS)
+    best_tags = np.concatenate([best_tags,tags])
+    best = np.concatenate([best,bc])
+    if len(best)>n_keep:
+      keep = np.argpartition(-best,n_keep)[:n_keep]
+      best_tags, best = best_tags[keep], best[keep]
+  order = np.argsort(-best)
+  return best_tags[order], best[order]
+
+def search(levels=(1,2,3),ace_side_count=(False,True),n_keep=1000,n_simulate=20,
+           ramp=None,n_shoes=2**15,n_decks=6,penetration=0.75,rules=None,seed=0,fast=False,
+           cards_per_round=5.4):
+  """
+  Searches every level, with and without an ace side count.
+
+  For each, the n_keep candidates with the highest betting correlation are
+  scored by playing efficiency, and the n_simulate best by betting
+  correlation are simulated on the same shoes, played out card by card with
+  basic strategy (see CountEvaluation.PlayedShoeSample), or with fast by the
+  estimator CountEvaluation.LinearEVShoeSample at cards_per_round, along with
+  the systems of modules.Count for reference. Using the same shoes makes
+  the differences between systems far more precise than se_per_hour, the
+  standard error of each one's win rate alone. The true count of every system
+  is scaled to that of Hi-Lo, by the standard deviation of its tags, so one
+  ramp suits them all.
+
+  Returns:
+      pd.DataFrame: The simulated systems, best win rate first, and the
+      playing efficiency and betting correlation of every kept candidate.
+  """
+  EOR = cache.EORs(rules=rules)['EOR']
+  decisions = decision_gradients(rules=rules,n_decks=n_decks)
+  rows = []
+  for level in levels:
+    for side in ace_side_count:
+      tags, bc = top_betting_correlation(level,side,n_keep,EOR,rules)
+      pe = playing_efficiency(tags,decisions)
+      for t,b,e,rank in zip(tags,bc,pe,range(len(bc))):
+        rows.append({'level':level,'ace_side_count':side,'tags':tuple(t.tolist()),
+                     'betting_correlation':b,'playing_efficiency':e,'simulated':rank<n_simulate})
+  for name,t in COUNT_SYSTEMS.items():
+    rows.append({'level':int(np.abs(t).max()),'ace_side_count':False,'tags':tuple(t),
+                 'betting_correlation':betting_correlation(t,EOR),
+                 'playing_efficiency':playing_efficiency(t,decisions),
+                 'simulated':True,'name':name})
+  table = pd.DataFrame(rows)
+  if 'name' not in table:
+    table['name'] = None
+
+  simulated = table[table['simulated']]
+  tags = np.array(simulated['tags'].tolist(),dtype=float)
+  betting = np.where(simulated['ace_side_count'].to_numpy()[:,None],side_count_tags(tags,EOR),tags)
+  betting = betting*(tag_sd(COUNT_SYSTEMS['Hi-Lo'])/tag_sd(betting))[:,None]
+  ramp = ramp if ramp is not None else BetRamp()
+  totals, cards_per_round = simulate_totals(betting,ramp,n_shoes,n_decks,penetration,rules,seed,
+                                            fast=fast,cards_per_round=cards_per_round)
+  summary = summarize(totals)
+  for key in ['average_bet','win_per_hour','sd_per_hour','se_per_hour']:
+    table.loc[simulated.index,key] = summary[key]
+  table.loc[simulated.index,'cards_per_round'] = cards_per_round
+  return table.sort_values(['win_per_hour','betting_correlation'],ascending=False)
+
+if __name__ == '__main__':
+  with pd.option_context('display.width',150,'display.max_columns',None,'display.max_colwidth',40):
+    table = search()
+    print(table[table['simulated']].head(30))
@@ -0,0 +1,287 @@
+from functools import lru_cache
+import numpy as np
+
+# Exact analysis of a finite shoe, drawing cards without replacement, except
+# for splitting, which uses the usual post-split approximation (see split_EV).
+# A shoe is given as the counts of the 10 card values Ace,2,...,9,Face card.
+# The probability of the next card depends on every card already drawn, so
+# everything is a function of the remaining composition of the shoe. These
+# sub-results are memoized on that composition in bounded caches so the
+# many hands which leave the same shoe behind are only computed once.
+
+# Bounds on the number of compositions kept in each cache. The least
+# recently used entries are evicted beyond these.
+DEALER_CACHE_SIZE = 2**18
+PLAYER_CACHE_SIZE = 2**20
+
+# The dealer's final totals are 17,...,21 and bust (denoted 22)
+DEALER_TOTALS = list(range(17,23))
+
+def shoe_counts(n_decks=1):
+  return (n_decks*np.array([4]*9+[16])).tolist()
+
+def score(total,ace):
+  # score counting an ace as 11 if doing so doesn't cause bust
+  if ace and total<=11:
+    return total+10
+  return total
+
+def natural_card(upcard):
+  # The hole card which would give the dealer a natural, if any.
+  # The dealer checks for a natural, so once the player is playing the
+  # hole card is known not to be this card.
+  return {1:10,10:1}.get(upcard)
+
+# More than the most cards a dealer can draw.
+MAX_DRAWN = 12
+
+@lru_cache(maxsize=None)
+def dealer_sequences(upcard):
+  """
+  Groups every sequence of cards a dealer can draw after showing upcard, given
+  they don't have a natural, by the multiset of cards drawn.
+
+  The probability of drawing a specific sequence without replacement only depends
+  on how many of each card it contains, not on their order. So the dealer's final
+  total distribution for *any* shoe is a sum over these groups, weighted by the
+  number of orderings the dealer could actually draw each group in.
+
+  Returns:
+      tuple: (indicator, columns, n_drawn, final, log_orderings) for each group m.
+      indicator[m,i] is 1 when group m contains exactly k cards of value c+1, where
+      columns[i] = c*(MAX_DRAWN+1)+k. Only the (c,k) with k>0 which occur are
+      kept as columns. n_drawn[m] is the number of cards in the group, final[m]
+      is the index of the final total in DEALER_TOTALS, and log_orderings[m] is
+      the log of the number of valid orderings.
+  """
+  groups = {}
+  excluded = natural_card(upcard)
+  drawn = [0]*10
+  def draw(total,ace,first):
+    s = score(total,ace)
+    # Dealers must stand if their score is above or equal to 17
+    if s>=17:
+      key = (tuple(drawn),min(s,22)-17)
+      groups[key] = groups.get(key,0)+1
+      return
+    for card in range(1,11):
+      if first and card==excluded:
+        continue
+      drawn[card-1] += 1
+      draw(total+card,ace or card==1,False)
+      drawn[card-1] -= 1
+  draw(upcard,upcard==1,True)
+
+  keys = list(groups)
+  drawn = np.array([k[0] for k in keys])
+  n_drawn = drawn.sum(axis=1)
+  assert n_drawn.max()<MAX_DRAWN
+  flat = np.arange(10)*(MAX_DRAWN+1)+drawn
+  columns = np.unique(flat[drawn>0])
+  indicator = np.zeros((len(keys),len(columns)))
+  rows, cards = np.nonzero(drawn)
+  indicator[rows,np.searchsorted(columns,flat[rows,cards])] = 1
+  final = np.array([k[1] for k in keys])
+  log_orderings = np.log([groups[k] for k in keys])
+  return indicator, columns, n_drawn, final, log_orderings
+
+@lru_cache(maxsize=8)
+def log_falling_table(size):
+  """
+  Returns the table of log(n*(n-1)*...*(n-k+1)), the log of the number of ways of
+  drawing k cards in order from n, for n<size and k<=MAX_DRAWN. A large negative
+  number stands for log(0) when k>n.
+  """
+  n = np.arange(size)[:,None]-np.arange(MAX_DRAWN)
+  logs = np.where(n>0,np.log(np.maximum(n,1)),-1e30)
+  return np.concatenate([np.zeros((size,1)),np.cumsum(logs,axis=1)],axis=1)
+
+@lru_cache(maxsize=DEALER_CACHE_SIZE)
+def dealer_probs(counts,upcard):
+  """
+  Returns the probabilities of the dealer's final totals 17,...,21,22 (bust)
+  given the dealer shows upcard and doesn't have a natural, where counts is
+  the shoe the hole card and the dealer's hits are drawn from.
+  """
+  indicator, columns, n_drawn, final, log_orderings = dealer_sequences(upcard)
+  n = sum(counts)
+  # tables are sized in powers of 2 so they are shared by similar shoes
+  table = log_falling_table(1<<n.bit_length())
+  # The probability of each group is the number of orderings times the number
+  # of ways of drawing its cards divided by the number of ways of drawing that
+  # many cards. It's computed in log space so the product over card values is
+  # a single matrix product.
+  log_p = (indicator@table[counts,:].ravel()[columns]+log_orderings
+           -table[n,n_drawn])
+  ps = np.bincount(final,weights=np.exp(log_p),minlength=len(DEALER_TOTALS))
+  # conditional on the hole card not giving a natural
+  excluded = natural_card(upcard)
+  if excluded is not None:
+    ps /= (n-counts[excluded-1])/n
+  return ps.tolist()
+
+@lru_cache(maxsize=DEALER_CACHE_SIZE)
+def draw_probs(counts,upcard):
+  """
+  Returns the probability of the player drawing each card value from a shoe
+  of counts which still contains the dealer's (unseen) hole card.
+
+  For upcards other than an ace or a face card the hole card is just another
+  unknown card. Otherwise the hole card is known not to be the natural card,
+  which makes that card more likely for the player. After the player draws, the
+  hole card is again uniform over the remaining non-natural cards, so this holds
+  at every step.
+  """
+  n = sum(counts)
+  excluded = natural_card(upcard)
+  if excluded is None:
+    return [c/n for c in counts]
+  m = n-counts[excluded-1]
+  q = [c*(m-1)/(m*(n-1)) for c in counts]
+  q[excluded-1] = counts[excluded-1]/(n-1)
+  return q
+
+def remove_card(counts,card):
+  counts = list(counts)
+  counts[card-1] -= 1
+  return tuple(counts)
+
+@lru_cache(maxsize=PLAYER_CACHE_SIZE)
+def stand_EV(counts,player_score,upcard):
+  """
+  Returns the expected value of standing with player_score against upcard.
+  """
+  if player_score>21:
+    return -1.
+  ps = dealer_probs(counts,upcard)
+  # The player wins if the dealer busts or ends with less, and loses if the
+  # dealer ends with more without busting.
+  win = ps[5]+sum(ps[:max(0,player_score-17)])
+  lose = sum(ps[max(0,player_score-16):5])
+  return win-lose
+
+@lru_cache(maxsize=PLAYER_CACHE_SIZE)
+def hit_EV(counts,total,ace,upcard):
+  """
+  Returns the expected value of hitting and then continuing to hit or stand
+  optimally.
+  """
+  q = draw_probs(counts,upcard)
+  EV = 0.
+  for card in range(1,11):
+    if q[card-1]==0:
+      continue
+    total1 = total+card
+    if total1>21:
+      EV -= q[card-1]
+      continue
+    ace1 = ace or card==1
+    counts1 = remove_card(counts,card)
+    EV += q[card-1]*max(stand_EV(counts1,score(total1,ace1),upcard),
+                        hit_EV(counts1,total1,ace1,upcard))
+  return EV
+
+def double_EV(counts,total,ace,upcard):
+  """
+  Returns the expected value of doubling down, hitting exactly once for twice the bet.
+  """
+  q = draw_probs(counts,upcard)
+  EV = 0.
+  for card in range(1,11):
+    if q[card-1]>0:
+      EV += q[card-1]*stand_EV(remove_card(counts,card),score(total+card,ace or card==1),upcard)
+  return 2*EV
+
+def split_EV(counts,card,upcard):
+  """
+  Returns an approximation of the expected value of splitting a pair of card,
+  where counts already excludes both cards of the pair.
+
+  This is the usual post-split approximation rather than an exact result: each
+  split hand is played from the shoe left after the pair and the upcard as if
+  it were the only one, i.e. the cards drawn to the other split hand are not
+  removed. When aces are split, only one more card may be drawn. Doubling
+  after splitting is allowed.
+  """
+  q = draw_probs(counts,upcard)
+  EV = 0.
+  for card1 in range(1,11):
+    if q[card1-1]==0:
+      continue
+    counts1 = remove_card(counts,card1)
+    total, ace = card+card1, card==1 or card1==1
+    hand_EV = stand_EV(counts1,score(total,ace),upcard)
+    if card!=1:
+      hand_EV = max(hand_EV,hit_EV(counts1,total,ace,upcard),double_EV(counts1,total,ace,upcard))
+    EV += q[card1-1]*hand_EV
+  return 2*EV
+
+class FiniteShoeAnalysis():
+  def __init__(self,counts=None):
+    # counts is a list of the number of cards of each value Ace,2,...,9,Face card
+    # in the shoe. Defaults to a single deck.
+    if counts is None:
+      counts = shoe_counts()
+    self.counts = tuple(int(c) for c in counts)
+
+    self.action_EVs = None
+    self.EV = None
+
+  def compute(self):
+    # action_EVs gives the expected value of each action given the two cards of the
+    # player and the dealer's upcard, given the dealer doesn't have a natural.
+    # EV is the expected value of playing a hand of blackjack from this shoe.
+    # Both are exact except for splitting, whose EV is approximate (see split_EV),
+    # so EV is approximate for shoes where splitting is ever the best action.
+    self.action_EVs = {}
+    n = sum(self.counts)
+    EV = 0.
+    for card1 in range(1,11):
+      for card2 in range(card1,11):
+        for upcard in range(1,11):
+          counts = remove_card(remove_card(remove_card(self.counts,card1),card2),upcard)
+          if min(counts)<0:
+            continue
+          # probability of the player being dealt card1 and card2 (in either order),
+          # and then the dealer being dealt upcard.
+          p = (self.counts[card1-1]/n*(self.counts[card2-1]-(card1==card2))/(n-1)*
+               (self.counts[upcard-1]-(upcard==card1)-(upcard==card2))/(n-2))
+          if card1!=card2:
+            p *= 2
+
+          total, ace = card1+card2, card1==1
+          natural = score(total,ace)==21
+          if natural:
+            EVs = {'natural':1.5}
+          else:
+            EVs = {'stand':stand_EV(counts,score(total,ace),upcard),
+                   'hit':hit_EV(counts,total,ace,upcard),
+                   'double':double_EV(counts,total,ace,upcard)}
+            if card1==card2:
+              EVs['split'] = split_EV(counts,card1,upcard)
+          self.action_EVs[(card1,card2,upcard)] = EVs
+
+          # If the dealer has a natural, the player loses unless they have one too.
+          excluded = natural_card(upcard)
+          p_dealer_natural = 0 if excluded is None else counts[excluded-1]/sum(counts)
+          EV += p*(p_dealer_natural*(0 if natural else -1)+
+                   (1-p_dealer_natural)*max(EVs.values()))
+    self.EV = EV
+
+  def best_action(self,card1,card2,upcard):
+    # The action with the highest expected value for the player's two cards
+    # against the dealer's upcard.
+    EVs = self.action_EVs[(min(card1,card2),max(card1,card2),upcard)]
+    return max(EVs,key=EVs.get)
+
+  @staticmethod
+  def cache_info():
+    return {'dealer_probs':dealer_probs.cache_info(),
+            'stand_EV':stand_EV.cache_info(),
+            'hit_EV':hit_EV.cache_info()}
+
+if __name__ == '__main__':
+  for n_decks in [1,2,4,6,8]:
+    fs = FiniteShoeAnalysis(shoe_counts(n_decks))
+    fs.compute()
+    print(f"{n_decks} deck(s): EV = {fs.EV:.6f}")
@@ -0,0 +1,43 @@
+from modules import engine
+from modules.Rules import Rules
+import itertools
+import numpy as np
+import pandas as pd
+
+def rule_grid(hit_soft_17=(False,True),blackjack_payout=(1.5,1.2),double=('any','9-11','10-11'),
+              double_after_split=(True,False),surrender=(False,True)):
+  # Every combination of the given options as a list of Rules
+  return [Rules(*x) for x in itertools.product(hit_soft_17,blackjack_payout,double,
+                                               double_after_split,surrender)]
+
+def compute_rule_table(rules_list,card_probs=None):
+  """
+  Computes the EV and variance of the optimal strategy for every set of rules
+  and composition, see engine.sweep.
+
+  Args:
+      rules_list (list): The Rules to evaluate.
+      card_probs (np.ndarray, optional): The compositions, the probabilities of
+          the card values Ace,2,...,9,Face card, of shape (10,) or (N, 10).
+          Defaults to a single deck.
+
+  Returns:
+      pd.DataFrame: EV and V indexed by the rules (and the composition if
+      there's more than one), along with each rule's change in EV from the first.
+  """
+  if card_probs is None:
+    card_probs = np.array([4/52]*9+[16/52])
+  card_probs = np.asarray(card_probs,dtype=float)
+  r = engine.sweep(card_probs,rules_list)
+  rows = [dict(rules.key(),rules=str(rules),composition=j,EV=r['EV'][i,j],V=r['V'][i,j],
+               EV_change=r['EV'][i,j]-r['EV'][0,j])
+          for i,rules in enumerate(rules_list) for j in range(r['EV'].shape[1])]
+  table = pd.DataFrame(rows).set_index(['rules','composition'])
+  if card_probs.ndim==1:
+    table = table.droplevel('composition')
+  return table
+
+if __name__ == '__main__':
+  table = compute_rule_table(rule_grid())
+  with pd.option_context('display.max_rows',None,'display.max_columns',None,'display.width',120):
+    print(table[['EV','V','EV_change']].sort_values('EV',ascending=False))
@@ -4,12 +4,47 @@ VALID_CARD_NAMES = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K',
 VALID_CARD_SUITS = ['H', 'D', 'S', 'C']
 
 class Card:
-  def __init__(self,name,suit=None):
+  # Cards are interned: there is only ever one Card object for each name and suit,
+  # which every deck, shoe and hand shares. A card is stored as a small integer code,
+  # name index*4+suit index for the 52 cards with a suit and 52+name index for
+  # cards without one. The name and suit are derived from the code for display.
+  __slots__ = ('code','value')
+  _interned = {}
+
+  def __new__(cls,name,suit=None):
+    card = cls._interned.get((name,suit))
+    if card is not None:
+      return card
     assert name in VALID_CARD_NAMES, "Invalid card name"
     assert suit in VALID_CARD_SUITS + [None], "Invalid card suit"
-    self.name = name
-    self.suit = suit
-    self.value = self.name_to_value(name)
+    card = super().__new__(cls)
+    if suit is None:
+      card.code = 52+VALID_CARD_NAMES.index(name)
+    else:
+      card.code = 4*VALID_CARD_NAMES.index(name)+VALID_CARD_SUITS.index(suit)
+    card.value = cls.name_to_value(name)
+    cls._interned[(name,suit)] = card
+    return card
+
+  def __reduce__(self):
+    # unpickling goes through __new__ so it returns the interned card
+    return (Card,(self.name,self.suit))
+
+  @classmethod
+  def from_code(cls,code):
+    return CARDS[code]
+
+  @property
+  def name(self):
+    if self.code>=52:
+      return VALID_CARD_NAMES[self.code-52]
+    return VALID_CARD_NAMES[self.code//4]
+
+  @property
+  def suit(self):
+    if self.code>=52:
+      return None
+    return VALID_CARD_SUITS[self.code%4]
 
   @staticmethod
   def name_to_value(name):
@@ -38,3 +73,8 @@ class Card:
   def __str__(self):
     return self.name+self.suit_to_symbol(self.suit)
 
+# Every card indexed by its code, followed by the cards without a suit
+CARDS = ([Card(name,suit) for name in VALID_CARD_NAMES for suit in VALID_CARD_SUITS]+
+         [Card(name) for name in VALID_CARD_NAMES])
+# The value (1-10) of every code
+CARD_VALUES = np.array([card.value for card in CARDS])
@@ -0,0 +1,102 @@
+from modules.Card import CARD_VALUES
+import numpy as np
+
+# The tags of common card counting systems indexed by card value-1
+# (Ace,2,...,9,Face card). KO is unbalanced, the others sum to 0 over a deck.
+COUNT_SYSTEMS = {
+  'Hi-Lo':     [-1, 1, 1, 1, 1, 1, 0, 0, 0,-1],
+  'KO':        [-1, 1, 1, 1, 1, 1, 1, 0, 0,-1],
+  'Hi-Opt I':  [ 0, 0, 1, 1, 1, 1, 0, 0, 0,-1],
+  'Hi-Opt II': [ 0, 1, 1, 2, 2, 1, 1, 0, 0,-2],
+  'Omega II':  [ 0, 1, 1, 2, 2, 2, 1, 0,-1,-2],
+  'Zen':       [-1, 1, 1, 2, 2, 2, 1, 0, 0,-2],
+}
+
+class RunningCounts:
+  """
+  The running counts of several counting systems over the same Deck or Shoe.
+
+  Every system's tag of every card code is looked up from one table, so a
+  batch of drawn codes updates all the counts with a single sum.
+
+  Args:
+      systems (dict, optional): Names of the systems to their tags, indexed by
+          card value-1 or as dicts of card value (1-10) to tag. Defaults to
+          COUNT_SYSTEMS.
+      deck (Deck or Shoe, optional): The deck to attach to, see attach.
+      reset_on_shuffle (bool): Whether the counts start again from 0 whenever
+          cards are put back into the deck, as a player's do. By default they
+          carry on across shuffles until reset is called.
+  """
+  def __init__(self,systems=None,deck=None,reset_on_shuffle=False):
+    if systems is None:
+      systems = COUNT_SYSTEMS
+    self.names = list(systems)
+    tags = np.array([[t[value] for value in range(1,11)] if isinstance(t,dict) else t
+                     for t in systems.values()])
+    # The tag of every card code of every system, of shape (systems, codes)
+    self.code_tags = tags[:,CARD_VALUES-1]
+    self.counts = np.zeros(len(self.names),dtype=self.code_tags.dtype)
+    self.reset_on_shuffle = reset_on_shuffle
+    self.deck = None
+    if deck is not None:
+      self.attach(deck)
+
+  def attach(self,deck):
+    # Counts every card drawn from deck from now on
+    self.detach()
+    self.deck = deck
+    deck.subscribe(self.cards_drawn,self.reset if self.reset_on_shuffle else None,batched=True)
+
+  def detach(self):
+    if self.deck is not None:
+      self.deck.unsubscribe(self.cards_drawn)
+      self.deck = None
+
+  def reset(self):
+    self.counts[:] = 0
+
+  def cards_drawn(self,codes):
+    # codes is an array of the drawn card codes (see Card)
+    self.counts += self.code_tags[:,codes].sum(axis=1)
+
+  def __getitem__(self,name):
+    return self.counts[self.names.index(name)]
+
+  def true_counts(self):
+    # The running counts per deck remaining in the attached deck
+    return self.counts/(len(self.deck)/52)
+
+  def __str__(self):
+    return '\n'.join(f"{name}: {count:+d}" for name,count in zip(self.names,self.counts.tolist()))
+
+class CompositionCounter:
+  """
+  A histogram of the cards drawn from a Deck or Shoe, by card code (see Card)
+  since it was attached or last reset. values() sums it by card value.
+  """
+  def __init__(self,deck=None):
+    self.code_counts = np.zeros(len(CARD_VALUES),dtype=np.int64)
+    self.deck = None
+    if deck is not None:
+      self.attach(deck)
+
+  def attach(self,deck):
+    self.detach()
+    self.deck = deck
+    deck.subscribe(self.cards_drawn,batched=True)
+
+  def detach(self):
+    if self.deck is not None:
+      self.deck.unsubscribe(self.cards_drawn)
+      self.deck = None
+
+  def reset(self):
+    self.code_counts[:] = 0
+
+  def cards_drawn(self,codes):
+    self.code_counts += np.bincount(codes,minlength=len(CARD_VALUES))
+
+  def values(self):
+    # The number of cards drawn of each value (1-10)
+    return np.bincount(CARD_VALUES-1,weights=self.code_counts,minlength=10).astype(np.int64)
@@ -1,39 +1,96 @@
-from modules.Card import Card, VALID_CARD_NAMES, VALID_CARD_SUITS
+from modules.Card import CARDS
 import numpy as np
 
 class Deck:
-  def __init__(self,unshuffled = False):
+  def __init__(self,unshuffled = False, seed = None):
+    # Each deck shuffles with its own random generator so a seed makes
+    # the order of the cards reproducible.
+    self.rng = np.random.default_rng(seed)
     self.cards = self.create_deck()
     self.discarded_cards = []
+    self.observers = []
     if not unshuffled:
       self.shuffle_deck()
 
+  def __len__(self):
+    # number of cards remaining to be drawn
+    return len(self.cards)
+
+  def subscribe(self,on_draw,on_return=None,batched=False):
+    # on_draw(code) is called with the code (see Card) of every card drawn, or
+    # if batched, on_draw(codes) with a read only array of the codes of each draw.
+    # on_return() is called whenever cards are put back into the deck.
+    self.observers.append((on_draw,on_return,batched))
+
+  def unsubscribe(self,on_draw):
+    self.observers = [o for o in self.observers if o[0]!=on_draw]
+
+  def _drawn(self,codes):
+    # Batched observers share one read only array of the codes
+    array = None
+    for on_draw,_,batched in self.observers:
+      if batched:
+        if array is None:
+          array = np.array(codes,dtype=np.int16)
+          array.flags.writeable = False
+        on_draw(array)
+      else:
+        for code in codes:
+          on_draw(code)
+
+  def _returned(self):
+    for _,on_return,_ in self.observers:
+      if on_return is not None:
+        on_return()
+
+  def value_counts(self):
+    # The number of remaining cards of each value (1-10)
+    return np.bincount([card.value-1 for card in self.cards],minlength=10)
+
   def create_deck(self):
-    return [Card(name,suit) for name in VALID_CARD_NAMES for suit in VALID_CARD_SUITS]
+    return CARDS[:52]
 
   def shuffle_deck(self):
-    np.random.shuffle(self.cards)
+    self.rng.shuffle(self.cards)
 
   def reshuffle_deck(self):
     self.cards = self.create_deck()
     self.discarded_cards = []
     self.shuffle_deck()
+    self._returned()
 
   def draw_cards(self,n):
     assert n>0, "need to draw more than 0 cards"
-    return [self.draw_card() for _ in range(n)]
+    # Observers are told about the cards drawn before the deck ran out
+    # separately from those drawn after it was reshuffled.
+    cards = []
+    while len(cards)<n:
+      if len(self.cards) == 0:
+        self.reshuffle_discards()
+      k = min(n-len(cards),len(self.cards))
+      drawn, self.cards = self.cards[:k], self.cards[k:]
+      self._drawn([card.code for card in drawn])
+      cards.extend(drawn)
+    return cards
 
   def draw_card(self):
       if len(self.cards) == 0:
-          # If the deck is empty, reshuffle the discard pile into the deck
-          self.cards.extend(self.discarded_cards)
-          self.discarded_cards = []
-          self.shuffle_deck()
+          self.reshuffle_discards()
 
       # Draw a card from the top of the deck and remove it from the deck
       drawn_card = self.cards.pop(0)
+      if self.observers:
+        self._drawn([drawn_card.code])
       return drawn_card
 
+  def reshuffle_discards(self):
+      # If the deck is empty, reshuffle the discard pile into the deck
+      assert len(self.discarded_cards)>0, "no cards left to draw"
+      self.cards.extend(self.discarded_cards)
+      self.discarded_cards = []
+      self.shuffle_deck()
+      self._returned()
+
   def add_to_discard(self, card_or_cards):
       if isinstance(card_or_cards, list):
           self.discarded_cards.extend(card_or_cards)
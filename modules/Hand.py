@@ -1,4 +1,6 @@
 class Hand:
+  __slots__ = ('cards','has_ace','useable_ace','simple_score','score','bet','done')
+
   def __init__(self):
     self.cards = []
     self.has_ace = False # If hand contains any ace
@@ -56,16 +58,18 @@ class Hand:
 
   def add_card(self,card):
     self.cards.append(card)
-    if card.name == 'A':
+    value = card.value
+    if value == 1:
         self.has_ace = True
 
-    self.simple_score+=card.value
+    simple_score = self.simple_score+value
+    self.simple_score = simple_score
 
-    if self.has_ace and self.simple_score<=11:
-      self.score = self.simple_score+10
+    if self.has_ace and simple_score<=11:
+      self.score = simple_score+10
       self.useable_ace = True
     else:
-      self.score = self.simple_score
+      self.score = simple_score
       self.useable_ace = False
 
   def is_bust(self):
@@ -0,0 +1,71 @@
+import numpy as np
+
+# The player scores which may be doubled down on for each doubling rule
+DOUBLE_SCORES = {
+  'any':None,
+  '9-11':(9,10,11),
+  '10-11':(10,11)
+}
+
+class Rules:
+  """
+  The table rules the analysis depends on. The defaults are the rules the
+  analysis has always assumed.
+
+  Args:
+      hit_soft_17 (bool): Whether the dealer hits a soft 17 (H17) instead of
+          standing on all 17s (S17).
+      blackjack_payout (float): What a player's natural pays, 1.5 for 3:2.
+      double (str): The two card hands which may be doubled down, 'any',
+          '9-11' or '10-11' (by score).
+      double_after_split (bool): Whether hands may be doubled down after splitting.
+      surrender (bool): Whether late surrender is offered, giving up half the
+          bet after the dealer has checked for a natural.
+
+  When aces are split, only one more card may be drawn to each.
+  """
+  def __init__(self,hit_soft_17=False,blackjack_payout=1.5,double='any',
+               double_after_split=True,surrender=False):
+    assert double in DOUBLE_SCORES, "Invalid doubling rule"
+    self.hit_soft_17 = bool(hit_soft_17)
+    self.blackjack_payout = float(blackjack_payout)
+    self.double = double
+    self.double_after_split = bool(double_after_split)
+    self.surrender = bool(surrender)
+
+  def key(self):
+    # Every rule as a dict, e.g. for modules.cache
+    return {'hit_soft_17':self.hit_soft_17,
+            'blackjack_payout':self.blackjack_payout,
+            'double':self.double,
+            'double_after_split':self.double_after_split,
+            'surrender':self.surrender}
+
+  def dealer_key(self):
+    # The rules the dealer's play depends on. Rules with the same dealer_key
+    # share the dealer's final total distribution and the hit/stand results.
+    return self.hit_soft_17
+
+  def can_double(self,scores):
+    # Whether hands with the given scores may be doubled down
+    allowed = DOUBLE_SCORES[self.double]
+    if allowed is None:
+      return np.ones(np.shape(scores),dtype=bool)
+    return np.isin(scores,allowed)
+
+  def __eq__(self,other):
+    return isinstance(other,Rules) and self.key()==other.key()
+
+  def __hash__(self):
+    return hash(tuple(self.key().items()))
+
+  def __repr__(self):
+    return 'Rules('+', '.join(f"{k}={v!r}" for k,v in self.key().items())+')'
+
+  def __str__(self):
+    payout = {1.5:'3:2',1.2:'6:5',1.0:'1:1'}.get(self.blackjack_payout,str(self.blackjack_payout))
+    return ', '.join(['H17' if self.hit_soft_17 else 'S17',
+                      f"BJ pays {payout}",
+                      f"double {self.double}",
+                      'DAS' if self.double_after_split else 'no DAS',
+                      'late surrender' if self.surrender else 'no surrender'])
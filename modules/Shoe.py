@@ -0,0 +1,169 @@
+from modules.Card import CARDS, CARD_VALUES
+import numpy as np
+
+# Every card is stored as its integer code (see Card). Drawn cards are
+# returned as the interned Card objects rather than new objects.
+
+class Shoe:
+  """
+  A shoe of one or more decks which can be used in place of a Deck.
+
+  The cards are a compact integer array with a cursor marking the next card,
+  so drawing never moves the remaining cards. Like Deck, discarded cards are
+  only reshuffled back in once the shoe is empty. If penetration is given, a cut
+  card is placed after that fraction of the shoe and new_round reshuffles the
+  whole shoe once it has been reached. Cards still in play when the whole shoe
+  is reshuffled are back in it, so they're ignored when they're discarded.
+  """
+  def __init__(self,n_decks=1,penetration=None,unshuffled=False,seed=None):
+    self.n_decks = n_decks
+    self.penetration = penetration
+    self.rng = np.random.default_rng(seed)
+    self.n_cards = 52*n_decks
+    self.cut = self.n_cards if penetration is None else int(penetration*self.n_cards)
+
+    self.codes = np.tile(np.arange(52,dtype=np.int16),n_decks)
+    self.cursor = 0
+    self.discarded_codes = np.empty(self.n_cards,dtype=np.int16)
+    self.n_discarded = 0
+    # The number of cards of each code dealt before the last reshuffle of the
+    # whole shoe and not discarded since
+    self.stale = np.zeros(52,dtype=np.int64)
+    self.observers = []
+    if not unshuffled:
+      self.shuffle_deck()
+
+  def __len__(self):
+    # number of cards remaining to be drawn
+    return len(self.codes)-self.cursor
+
+  @property
+  def cards(self):
+    # The remaining cards, in the order they'll be drawn
+    return [CARDS[code] for code in self.codes[self.cursor:]]
+
+  def subscribe(self,on_draw,on_return=None,batched=False):
+    """
+    Calls on_draw(code) with the code (see Card) of every card drawn, or if
+    batched, on_draw(codes) once per draw with the codes drawn as an array.
+    The array is a read only view of the shoe rather than a copy, so it must
+    be copied to be kept. on_return() is called whenever cards are put back
+    into the shoe.
+    """
+    self.observers.append((on_draw,on_return,batched))
+
+  def unsubscribe(self,on_draw):
+    self.observers = [o for o in self.observers if o[0]!=on_draw]
+
+  def _drawn(self,codes):
+    if not self.observers:
+      return
+    codes = codes.view()
+    codes.flags.writeable = False
+    for on_draw,_,batched in self.observers:
+      if batched:
+        on_draw(codes)
+      else:
+        for code in codes.tolist():
+          on_draw(code)
+
+  def _returned(self):
+    for _,on_return,_ in self.observers:
+      if on_return is not None:
+        on_return()
+
+  def value_counts(self):
+    # The number of remaining cards of each value (1-10)
+    return np.bincount(CARD_VALUES[self.codes[self.cursor:]]-1,minlength=10)
+
+  def shuffle_deck(self):
+    self.rng.shuffle(self.codes[self.cursor:])
+
+  def reshuffle_deck(self):
+    # Puts every card back into the shoe and shuffles. The cards in play are
+    # those neither in the shoe nor discarded.
+    self.stale += (self.n_decks-np.bincount(self.codes[self.cursor:],minlength=52)
+                   -np.bincount(self.discarded_codes[:self.n_discarded],minlength=52))
+    self.codes = np.tile(np.arange(52,dtype=np.int16),self.n_decks)
+    self.cursor = 0
+    self.n_discarded = 0
+    self.shuffle_deck()
+    self._returned()
+
+  def cut_card_reached(self):
+    return self.cursor>=self.cut
+
+  def new_round(self):
+    # Reshuffles between rounds once the cut card has been reached
+    if self.cut_card_reached():
+      self.reshuffle_deck()
+
+  def reshuffle_discards(self):
+    # If the shoe is empty, reshuffle the discard pile into the shoe
+    self.codes = self.discarded_codes[:self.n_discarded].copy()
+    self.cursor = 0
+    self.n_discarded = 0
+    self.shuffle_deck()
+    self._returned()
+
+  def draw_codes(self,n):
+    """
+    Draws n cards as an array of card codes. Unless the shoe runs out part way,
+    this is a slice of the shoe rather than a copy.
+    """
+    assert n>0, "need to draw more than 0 cards"
+    if n<=len(self):
+      codes = self.codes[self.cursor:self.cursor+n]
+      self.cursor += n
+      self._drawn(codes)
+      return codes
+    codes = [self.codes[self.cursor:].copy()]
+    n -= len(self)
+    self.cursor = len(self.codes)
+    if len(codes[0])>0:
+      self._drawn(codes[0])
+    while n>0:
+      self.reshuffle_discards()
+      assert len(self)>0, "no cards left to draw"
+      codes.append(self.draw_codes(min(n,len(self))).copy())
+      n -= len(codes[-1])
+    return np.concatenate(codes)
+
+  def draw_values(self,n):
+    # values (1-10) of n drawn cards
+    return CARD_VALUES[self.draw_codes(n)]
+
+  def draw_cards(self,n):
+    return [CARDS[code] for code in self.draw_codes(n)]
+
+  def draw_card(self):
+    if len(self)==0:
+      self.reshuffle_discards()
+    code = self.codes[self.cursor]
+    self.cursor += 1
+    self._drawn(self.codes[self.cursor-1:self.cursor])
+    return CARDS[code]
+
+  def add_to_discard(self, card_or_cards):
+    # Accepts Card objects or card codes, singly or in a list or array
+    if isinstance(card_or_cards,(list,tuple,np.ndarray)):
+      codes = [c if isinstance(c,(int,np.integer)) else c.code for c in card_or_cards]
+    else:
+      c = card_or_cards
+      codes = [c if isinstance(c,(int,np.integer)) else c.code]
+    if self.stale.any():
+      # Cards dealt before the last reshuffle are already back in the shoe
+      fresh = []
+      for code in codes:
+        if self.stale[code]>0:
+          self.stale[code] -= 1
+        else:
+          fresh.append(code)
+      codes = fresh
+    n = self.n_discarded+len(codes)
+    assert n<=len(self.discarded_codes), "more cards discarded than were dealt"
+    self.discarded_codes[self.n_discarded:n] = codes
+    self.n_discarded = n
+
+  def summary(self):
+    return f"The shoe has {len(self)} cards remaining."
@@ -0,0 +1,116 @@
+from modules import engine
+from modules.Card import CARD_VALUES
+from modules.Rules import Rules
+import numpy as np
+
+class ShoeTracker:
+  """
+  Keeps the current edge of a Deck or Shoe as it's dealt.
+
+  The remaining composition is updated with every card drawn and the EV (and
+  V) of the remaining cards is estimated from their gradients with respect to
+  the card probabilities, see engine.solve_gradient:
+    EV(p) ~ EV(p0) + EV_grad.(p-p0)
+  where p0 is the composition at the last exact solve. Since p = counts/n,
+  EV_grad.p = (EV_grad.counts)/n and EV_grad.counts changes by one entry of
+  EV_grad per card, so every card takes constant time. The optimal strategy
+  only changes the EV to second order (its gradient is that of the fixed
+  strategy), so the estimate drifts slowly. It's solved exactly again every
+  refresh_every cards to bound the drift, and whenever cards are put back.
+
+  Like BlackjackAnalysis(card_probs), the EV is that of drawing with
+  replacement from the remaining composition. Once every card has been dealt
+  there's no composition left, so EV, V and true_count are None until cards
+  are put back.
+
+  Args:
+      deck (Deck or Shoe, optional): The deck to attach to, see attach.
+      tags (dict, optional): The counting tags of each card value (1-10) for
+          the running and true counts. Defaults to no count.
+      rules (Rules, optional): The table rules. Defaults to Rules().
+      refresh_every (int): The number of cards between exact solves.
+  """
+  def __init__(self,deck=None,tags=None,rules=None,refresh_every=52):
+    self.rules = rules if rules is not None else Rules()
+    self.refresh_every = refresh_every
+    self.tags = np.zeros(10) if tags is None else np.array([tags[value] for value in range(1,11)],dtype=float)
+    self.deck = None
+    self.counts = np.array([4]*9+[16])
+    self.running_count = 0
+    if deck is not None:
+      self.attach(deck)
+    else:
+      self.refresh()
+
+  def attach(self,deck):
+    # Follows every card drawn from deck, starting from its remaining cards
+    if self.deck is not None:
+      self.deck.unsubscribe(self.card_drawn)
+    self.deck = deck
+    deck.subscribe(self.card_drawn,self.cards_returned)
+    self.cards_returned()
+
+  def detach(self):
+    if self.deck is not None:
+      self.deck.unsubscribe(self.card_drawn)
+      self.deck = None
+
+  def cards_returned(self):
+    # Cards were put back into the deck (reshuffled), so recount what's left.
+    # The count starts again from 0 as it does after a shuffle.
+    self.counts = self.deck.value_counts()
+    self.running_count = 0
+    self.refresh()
+
+  def refresh(self):
+    # Solves the current composition exactly
+    self.n = int(self.counts.sum())
+    self.since_refresh = 0
+    if self.n==0:
+      return
+    probs = self.counts/self.n
+    r = engine.solve_stages(probs[None],rules=self.rules,dense=False,variance=False)
+    g = engine.solve_gradient(probs,r['hit_matrix'][0],r['dd_matrix'][0],r['split_matrix'][0],self.rules)
+    self.EV_grad, self.V_grad = g['EV_grad'], g['V_grad']
+    # The estimates are constant+grad.counts/n
+    self._EV_base = g['EV']-self.EV_grad@probs
+    self._V_base = g['V']-self.V_grad@probs
+    self._EV_dot = self.EV_grad@self.counts
+    self._V_dot = self.V_grad@self.counts
+
+  def card_drawn(self,code):
+    # Removes the card with the given code (see Card) from the composition
+    i = CARD_VALUES[code]-1
+    self.counts[i] -= 1
+    self.n -= 1
+    self.running_count += self.tags[i]
+    self._EV_dot -= self.EV_grad[i]
+    self._V_dot -= self.V_grad[i]
+    self.since_refresh += 1
+    if self.since_refresh>=self.refresh_every and self.n>0:
+      self.refresh()
+
+  @property
+  def EV(self):
+    if self.n==0:
+      return None
+    return self._EV_base+self._EV_dot/self.n
+
+  @property
+  def V(self):
+    if self.n==0:
+      return None
+    return self._V_base+self._V_dot/self.n
+
+  @property
+  def true_count(self):
+    # The running count per deck remaining
+    if self.n==0:
+      return None
+    return self.running_count/(self.n/52)
+
+  def summary(self):
+    if self.n==0:
+      return f"No cards remaining, running count {self.running_count:+g}"
+    return (f"{self.n} cards remaining, EV {100*self.EV:+.3f}%, "
+            f"running count {self.running_count:+g}, true count {self.true_count:+.1f}")
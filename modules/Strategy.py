@@ -0,0 +1,102 @@
+from modules import hand_ids
+from modules import cache
+import numpy as np
+
+ACTIONS = ['stand','hit','double','split']
+
+# Bits of the packed action table
+HIT = 1
+DOUBLE = 2
+SPLIT = 4
+
+def _decode(code,can_split,can_double=True):
+  # Splitting comes first if possible, then doubling down, then hitting. When
+  # doubling down isn't allowed the hit bit decides, as it was computed.
+  if can_split and code&SPLIT:
+    return 'split'
+  if can_double and code&DOUBLE:
+    return 'double'
+  if code&HIT:
+    return 'hit'
+  return 'stand'
+
+class CompiledStrategy:
+  """
+  The hit, double down and split matrices packed into one small integer table
+  indexed by (player hand id, dealer upcard value-1). Hand ids are those of
+  modules.hand_ids, as in modules.engine. Each entry has a bit for each of
+  hitting, doubling down and splitting, so one lookup answers any decision.
+  """
+  def __init__(self,hit,dd,split):
+    # hit, dd and split are the boolean strategy matrices as arrays,
+    # see BlackjackAnalysis.strategyArrays.
+    table = np.zeros((hand_ids.N_HANDS,10),dtype=np.uint8)
+    table |= np.asarray(hit,dtype=bool)*np.uint8(HIT)
+    table |= np.asarray(dd,dtype=bool)*np.uint8(DOUBLE)
+    table[hand_ids.PAIR_IDS] |= np.asarray(split,dtype=bool)*np.uint8(SPLIT)
+    self.table = table
+
+    # Plain python lists make single lookups cheaper than indexing numpy arrays.
+    self._rows = table.tolist()
+    self._ids = hand_ids.HAND_ID_TABLE.tolist()
+    self._actions = [[[_decode(code,can_split,can_double) for code in range(8)]
+                      for can_double in (False,True)] for can_split in (False,True)]
+
+  @classmethod
+  def from_analysis(cls,bl):
+    return cls(*bl.strategyArrays())
+
+  @classmethod
+  def from_table(cls,table):
+    # A strategy from a packed table as in self.table
+    table = np.asarray(table,dtype=np.uint8)
+    return cls(table&HIT,table&DOUBLE,table[hand_ids.PAIR_IDS]&SPLIT)
+
+  @classmethod
+  def from_cache(cls,card_probs=None,rules=None):
+    # The strategy for card_probs and rules from modules.cache, defaulting to a
+    # single deck and the default rules
+    return cls.from_table(cache.strategy_table(card_probs,rules)['table'])
+
+  @classmethod
+  def from_csv(cls,path=""):
+    # Reads the strategy matrices exported by BlackjackAnalysis.exportStrategy
+    from BlackjackAnalysis import BlackjackAnalysis
+    bl = BlackjackAnalysis()
+    bl.importStrategy(path)
+    return cls.from_analysis(bl)
+
+  def arrays(self):
+    # The hit, double down and split matrices as boolean arrays
+    return ((self.table&HIT)>0, (self.table&DOUBLE)>0, (self.table[hand_ids.PAIR_IDS]&SPLIT)>0)
+
+  def hand_id(self,hand):
+    return self._ids[min(hand.simple_score,22)][hand.useable_ace]
+
+  def action(self,player_hand,upcard,can_split=False,can_double=True):
+    """
+    Returns the action ('stand', 'hit', 'double' or 'split') for a hand.
+
+    Args:
+        player_hand (Hand): The player's hand.
+        upcard (Card or int): The dealer's card showing, or its value.
+        can_split (bool): Whether the hand is a pair which may be split.
+        can_double (bool): Whether the hand may be doubled down. If not, a
+            hand the strategy doubles down on is hit or stood on instead.
+    """
+    value = upcard if isinstance(upcard,int) else upcard.value
+    return self._actions[can_split][can_double][self._rows[self.hand_id(player_hand)][value-1]]
+
+  def actions(self,hand_ids,upcards,can_split,can_double=True):
+    """
+    Returns the actions for many hands at once as indices into ACTIONS.
+
+    Args:
+        hand_ids (np.ndarray): The ids of the player hands.
+        upcards (np.ndarray): The values of the dealer's upcards.
+        can_split (np.ndarray): Whether each hand may be split.
+        can_double (np.ndarray): Whether each hand may be doubled down.
+    """
+    codes = self.table[hand_ids,np.asarray(upcards)-1]
+    return np.select([np.asarray(can_split)&(codes&SPLIT>0),np.asarray(can_double)&(codes&DOUBLE>0),codes&HIT>0],
+                     [3,2,1],0)
@@ -0,0 +1,147 @@
+from modules.version import VERSION
+from modules.Rules import Rules
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+
+# A content addressed cache of computed results on disk.
+# Every entry is keyed by a hash of everything which produced it: the kind of
+# result, the card probabilities, any other parameters (e.g. rules) and
+# modules.version.VERSION. The engine is only imported to compute a result
+# which isn't cached yet. An entry is a directory of .npy files, one per array,
+# so arrays can be memory mapped instead of read, plus a meta.json of the
+# inputs which is checked on every load. Entries are written to a temporary directory
+# and renamed into place, so a partially written entry is never read.
+
+DEFAULT_CARD_PROBS = [4/52]*9+[16/52]
+
+_cache_dir = os.environ.get('BLACKJACK_CACHE_DIR','.blackjack_cache')
+
+def cache_dir():
+  return _cache_dir
+
+def set_cache_dir(path):
+  # Changes where results are cached, e.g. to share a cache between directories
+  global _cache_dir
+  _cache_dir = path
+
+def key_inputs(kind,card_probs=None,**params):
+  # Everything the result depends on, in a form which can be compared and hashed
+  if card_probs is None:
+    card_probs = DEFAULT_CARD_PROBS
+  return {'kind':kind,
+          'engine':VERSION,
+          'card_probs':[float(p) for p in np.asarray(card_probs,dtype=float).ravel()],
+          'params':params}
+
+def entry_path(inputs):
+  digest = hashlib.sha256(json.dumps(inputs,sort_keys=True).encode()).hexdigest()
+  return os.path.join(_cache_dir,inputs['kind'],digest)
+
+def load(kind,card_probs=None,**params):
+  """
+  Returns the cached arrays for the inputs as read only memory maps, or None if
+  there's no entry for exactly these inputs.
+  """
+  inputs = key_inputs(kind,card_probs,**params)
+  path = entry_path(inputs)
+  try:
+    with open(os.path.join(path,'meta.json')) as f:
+      meta = json.load(f)
+  except (OSError,ValueError):
+    return None
+  if meta['inputs']!=inputs:
+    return None
+  return {name:np.load(os.path.join(path,name+'.npy'),mmap_mode='r') for name in meta['arrays']}
+
+def store(kind,arrays,card_probs=None,**params):
+  # arrays is a dict of names to arrays (or numbers)
+  inputs = key_inputs(kind,card_probs,**params)
+  path = entry_path(inputs)
+  os.makedirs(os.path.dirname(path),exist_ok=True)
+  tmp = tempfile.mkdtemp(dir=os.path.dirname(path))
+  try:
+    for name,x in arrays.items():
+      np.save(os.path.join(tmp,name+'.npy'),np.asarray(x))
+    with open(os.path.join(tmp,'meta.json'),'w') as f:
+      json.dump({'inputs':inputs,'arrays':list(arrays)},f)
+    os.replace(tmp,path)
+  except OSError:
+    # Another process stored the same entry first
+    if not os.path.exists(os.path.join(path,'meta.json')):
+      raise
+  finally:
+    shutil.rmtree(tmp,ignore_errors=True)
+
+def cached(kind,compute,card_probs=None,**params):
+  """
+  Returns the cached arrays for the inputs, calling compute() for a dict of the
+  arrays and storing them if they aren't cached yet.
+  """
+  arrays = load(kind,card_probs,**params)
+  if arrays is None:
+    arrays = compute()
+    store(kind,arrays,card_probs,**params)
+  return arrays
+
+def rules_key(rules):
+  return (rules if rules is not None else Rules()).key()
+
+def analysis(card_probs=None,rules=None):
+  """
+  Returns the strategy matrices (hit_matrix, dd_matrix, split_matrix,
+  surrender_matrix and surrender_pair_matrix as boolean arrays in the order of
+  modules.engine), EV and V of the composition card_probs (Ace,2,...,9,Face card),
+  defaulting to a single deck, under rules, defaulting to Rules().
+  """
+  def compute():
+    from modules import engine
+    r = engine.solve(DEFAULT_CARD_PROBS if card_probs is None else card_probs,rules=rules)
+    return {k:r[k] for k in ['hit_matrix','dd_matrix','split_matrix','surrender_matrix',
+                             'surrender_pair_matrix','EV','V']}
+  return cached('analysis',compute,card_probs,rules=rules_key(rules))
+
+def EORs(n_decks=1,n_removed=1,symmetric=False,card_probs=None,rules=None,processes=None):
+  """
+  Returns the effect of removals (EOR, indexed by card value-1) of removing
+  cards from a shoe of n_decks decks of the composition card_probs, following
+  the strategy of that composition under rules, see
+  ComputeEffectOfRemoval.compute_EOR_table. processes is only used if they need
+  to be computed.
+  """
+  def compute():
+    from ComputeEffectOfRemoval import compute_EOR_table
+    a = analysis(card_probs,rules)
+    strategy = (a['hit_matrix'],a['dd_matrix'],a['split_matrix'])
+    EOR = compute_EOR_table([n_decks],[n_removed],symmetric,strategy,processes,rules,card_probs)
+    return {'EOR':EOR.to_numpy()[:,0]}
+  return cached('eor',compute,card_probs,n_decks=n_decks,n_removed=n_removed,
+                symmetric=symmetric,rules=rules_key(rules))
+
+# The trainers only need the compact tables below, which are stored as their own
+# entries so loading them never imports pandas or runs the analysis.
+
+def strategy_table(card_probs=None,rules=None):
+  """
+  Returns the strategy of the composition card_probs under rules packed into
+  the uint8 table of modules.Strategy.CompiledStrategy.
+  """
+  def compute():
+    from modules.Strategy import CompiledStrategy
+    a = analysis(card_probs,rules)
+    return {'table':CompiledStrategy(a['hit_matrix'],a['dd_matrix'],a['split_matrix']).table}
+  return cached('strategy_table',compute,card_probs,rules=rules_key(rules))
+
+def count_tags(card_probs=None,rules=None):
+  """
+  Returns the card counting tags (indexed by card value-1) of the strategy of
+  the composition card_probs under rules: the effect of removal relative to
+  the EV, rounded to an integer.
+  """
+  def compute():
+    tags = np.round(-EORs(card_probs=card_probs,rules=rules)['EOR']/analysis(card_probs,rules)['EV'])
+    return {'tags':tags.astype(np.int8)}
+  return cached('count_tags',compute,card_probs,rules=rules_key(rules))
@@ -0,0 +1,175 @@
+from modules import engine
+from modules.engine import (N_HANDS, SCORES, NEXT_HAND, SORTED_IDS, BUST_ID, PAIR_IDS,
+                            SPLIT_IDS, HAND_IDS, hole_probs)
+from modules.Rules import Rules
+import numpy as np
+
+# The exact distribution (probability mass function) of the net result of a
+# round, rather than only its moments.
+#
+# With an infinite deck the player's cards are independent of the dealer's
+# draws given the upcard (and that the dealer has no natural). So every hand is
+# described by the distribution of how it *ends*, its category: busting, ending
+# on 16 or less, or ending on 17,...,21, each for a single or a doubled bet.
+# These distributions are propagated through the same stages as the moments
+# in modules.engine (holding, hitting, the hit/stand strategy, doubling down
+# and splitting) and are linear in the same way, so they're computed alike,
+# with the categories on the axis the moments are on. Only at the end are they
+# combined with the dealer's final totals into the net result. This keeps the
+# two halves of a split correctly dependent through the dealer's shared final
+# total: given it, they're independent.
+
+# The final scores a hand's category is kept by: bust, 16 or less, 17,...,21
+N_SCORES = 7
+# Categories are score index+N_SCORES*(doubled)
+N_CATEGORIES = 2*N_SCORES
+
+def score_index(scores):
+  return np.where(scores>21,0,np.where(scores<=16,1,scores-15))
+
+# The category of holding each hand (for a single bet)
+HOLD_CATEGORY = score_index(SCORES)
+
+def category_values():
+  """
+  Returns the net result of a hand of each category against each of the
+  dealer's final totals 17,...,21,22 (bust), of shape (N_CATEGORIES, 6).
+  """
+  dealer = np.array(engine.DEALER_TOTALS)
+  player = np.array([22,16]+list(range(17,22)))
+  v = np.where(player[:,None]>21,-1,
+               np.where(dealer>21,1,np.sign(player[:,None]-dealer)))
+  # a player's 16 or less only wins if the dealer busts
+  v[1] = np.where(dealer>21,1,-1)
+  return np.concatenate([v,2*v])
+
+def outcome_values(payout=1.5):
+  """
+  Returns the possible net results of a round, in increasing order: -4,...,4
+  for a split pair with both halves doubled down, -0.5 for surrendering, and
+  payout for a natural.
+  """
+  return np.unique(np.concatenate([np.arange(-4,5),[-0.5,payout]]))
+
+def _indicator(x,values):
+  # one hot encodes x (of any shape) over values on a new last axis
+  return (np.asarray(x)[...,None]==values).astype(float)
+
+def hold_distributions(n):
+  """
+  Returns the category distribution of holding every hand, of shape
+  (n, N_CATEGORIES, 34, 10) to line up with the moments in modules.engine.
+  """
+  F = np.zeros((N_CATEGORIES,N_HANDS))
+  F[HOLD_CATEGORY,np.arange(N_HANDS)] = 1
+  return np.broadcast_to(F[None,:,:,None],(n,N_CATEGORIES,N_HANDS,10))
+
+def hit_stand_distributions(probs,hit,F_hold):
+  """
+  Returns the category distribution of following the hit/stand strategy hit,
+  see engine.expected_M. Hands are visited in decreasing order of sum so the
+  distribution of every hand a hand can be hit to is already known.
+  """
+  F = np.zeros(F_hold.shape,dtype=probs.dtype)
+  hit = np.broadcast_to(hit,F_hold[:,0].shape)
+  for i in SORTED_IDS:
+    if i==BUST_ID:
+      F[:,:,i] = F_hold[:,:,i]
+      continue
+    F_next = np.einsum('bc,bmcd->bmd',probs,F[:,:,NEXT_HAND[i]])
+    F[:,:,i] = np.where(hit[:,None,i],F_next,F_hold[:,:,i])
+  return F
+
+def doubled(F):
+  # moves the distribution of a single bet to that of a doubled one
+  return np.concatenate([np.zeros_like(F[:,:N_SCORES]),F[:,:N_SCORES]],axis=1)
+
+def split_half_distributions(probs,F_hold,F_after):
+  """
+  Returns the category distribution of each half of each pair after splitting,
+  of shape (N, N_CATEGORIES, 10, 10), see engine.expected_split.
+  """
+  after = NEXT_HAND[SPLIT_IDS]
+  aces = (PAIR_IDS==HAND_IDS['2,1'])[:,None,None]
+  F = np.where(aces,F_hold[:,:,after],F_after[:,:,after])
+  return np.einsum('bc,bmpcd->bmpd',probs,F)
+
+def solve_distribution(probs,hit=None,dd=None,split=None,rules=None):
+  """
+  Computes the exact distribution of the net result of a round for a batch of
+  compositions, following the optimal strategy of each (or the given one).
+
+  The strategy and surrender decisions come from engine.solve_stages. The
+  variance here is exact for splits, where the moments in modules.engine
+  treat the two halves as independent of each other.
+
+  Args:
+      probs (np.ndarray): The probabilities of the 10 card values, of shape (10,) or (N, 10).
+      hit, dd, split (np.ndarray): Boolean strategy matrices to evaluate, as for
+          engine.solve_stages. If None, the strategy is computed.
+      rules (Rules, optional): The table rules. Defaults to Rules().
+
+  Returns:
+      dict: 'values', the possible net results (see outcome_values), 'pmf'
+      the probability of each, 'pmf_dealer' the probability of each for every
+      dealer upcard, of shape (10, len(values)), and 'EV' and 'V'. Every array
+      but 'values' has a leading axis over compositions if probs does.
+  """
+  if rules is None:
+    rules = Rules()
+  single = np.ndim(probs)==1
+  probs = np.atleast_2d(np.asarray(probs,dtype=float))
+  n = len(probs)
+  r = engine.solve_stages(probs,hit,dd,split,rules,dense=False,variance=False)
+  values = outcome_values(rules.blackjack_payout)
+
+  F_hold = hold_distributions(n)
+  F_M = hit_stand_distributions(probs,r['hit_matrix'],F_hold)
+  F_dd = doubled(engine.expected_hit(probs,F_hold))
+  F_nd = np.where(r['dd_matrix'][:,None],F_dd,F_M)
+  F_half = split_half_distributions(probs,F_hold,F_nd if rules.double_after_split else F_M)
+
+  # The net result of each category against each dealer total, and of the
+  # sum of both halves of a split
+  v = category_values()
+  W1 = _indicator(v,values)
+  W2 = _indicator(v[:,None]+v[None],values)
+  ps_nn = r['dealer_ps_nn']
+  P_hand = np.einsum('bdt,bcjd,ctk->bjdk',ps_nn,F_nd,W1,optimize=True)
+  # The joint distribution of both halves, (N, 10 upcards, 10 pairs, categories**2),
+  # against the results of each pair of categories given the upcard
+  F_both = np.einsum('bcpd,bepd->bdpce',F_half,F_half).reshape(n,10,10,-1)
+  W_both = np.einsum('bdt,cetk->bdcek',ps_nn,W2).reshape(n,10,-1,len(values))
+  P_split = (F_both@W_both).swapaxes(1,2)
+  P_pair = np.where(r['split_matrix'][...,None],P_split,P_hand[:,PAIR_IDS])
+  surrender = _indicator(-0.5,values)
+  P_hand = np.where(r['surrender_matrix'][...,None],surrender,P_hand)
+  P_pair = np.where(r['surrender_pair_matrix'][...,None],surrender,P_pair)
+
+  natural_prob,hole_pair_probs,hole_hand_probs = hole_probs(probs)
+  win_natural = _indicator(rules.blackjack_payout,values)
+  # Given the dealer has no natural
+  P_nn = (np.einsum('bj,bjdk->bdk',hole_hand_probs,P_hand)+
+          np.einsum('bp,bpdk->bdk',hole_pair_probs,P_pair)+
+          (natural_prob[:,None]*win_natural)[:,None])
+  # Given the dealer has a natural, the player only pushes with a natural
+  P_n = (1-natural_prob)[:,None]*_indicator(-1,values)+natural_prob[:,None]*_indicator(0,values)
+  natural = r['natural'][...,None]
+  pmf_dealer = natural*P_n[:,None]+(1-natural)*P_nn
+  pmf = np.einsum('bd,bdk->bk',probs,pmf_dealer)
+
+  EV = pmf@values
+  out = {'values':values,'pmf':pmf,'pmf_dealer':pmf_dealer,
+         'EV':EV,'V':pmf@values**2-EV**2}
+  if single:
+    out = {k:v if k=='values' else v[0] for k,v in out.items()}
+  return out
+
+def moment(values,pmf,k,central=True):
+  # The k-th (central) moment of a distribution over values
+  mean = pmf@values if central else 0
+  return pmf@(values-mean)**k
+
+def tail_probability(values,pmf,x):
+  # P(net result <= x)
+  return pmf[...,values<=x].sum(axis=-1)
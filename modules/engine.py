@@ -0,0 +1,709 @@
+from modules.Rules import Rules
+from modules.hand_ids import (HAND_IDS, N_HANDS, SUMS, ACES, SCORES, SORTED_IDS, SINGLE_IDS,
+                              PAIR_IDS, SPLIT_IDS, BUST_ID, SOFT_17_ID)
+from collections import OrderedDict
+import numpy as np
+
+# The array engine behind BlackjackAnalysis.compute.
+# Every hand (simple_score, useable ace) is given an integer id, see
+# modules.hand_ids, so all the matrices of the analysis are plain numpy arrays
+# indexed by those ids. Pandas is only used by BlackjackAnalysis to label the
+# results for export.
+
+# The dealer's final totals, 17,...,21 and bust (denoted 22)
+DEALER_TOTALS = list(range(17,23))
+
+def _next_hand(sum0,ace0,card):
+  # useable ace logic
+  # if you have an ace and using that ace (adding 10) doesn't make you bust
+  # (go over 21), then you have a useable ace
+  if (card==1 or ace0==1) and (sum0+card+10<=21):
+    ace1 = 1
+  else:
+    ace1 = 0
+  sum1 = min(sum0+card,22)
+  return HAND_IDS[f"{sum1},{ace1}"]
+
+# NEXT_HAND[i,c] is the id of the hand reached from hand i by drawing a card of value c+1
+NEXT_HAND = np.array([[_next_hand(SUMS[i],ACES[i],card) for card in range(1,11)]
+                      for i in range(N_HANDS)])
+
+# HIT_INDICATOR[i,c,j] is 1 when drawing a card of value c+1 takes hand i to hand j
+HIT_INDICATOR = np.zeros((N_HANDS,10,N_HANDS))
+HIT_INDICATOR[np.arange(N_HANDS)[:,None],np.arange(10)[None,:],NEXT_HAND] = 1
+
+# For each pair of first two cards, the hand id they make.
+# Naturals (an ace and a ten) and pairs are marked so they can be separated.
+HOLE_HANDS = np.array([[HAND_IDS[f"{c1+c2},{int(min(c1,c2)==1)}"] for c2 in range(1,11)]
+                       for c1 in range(1,11)])
+HOLE_NATURAL = HOLE_HANDS==HAND_IDS['11,1']
+HOLE_PAIR = np.eye(10,dtype=bool)&~HOLE_NATURAL
+HOLE_OTHER = ~HOLE_NATURAL&~HOLE_PAIR
+
+# HOLE_HAND_MAP[k,j] is 1 when the k-th (flattened) pair of first two cards is
+# neither a natural nor a pair and makes hand j
+HOLE_HAND_MAP = np.zeros((100,N_HANDS))
+HOLE_HAND_MAP[np.flatnonzero(HOLE_OTHER),HOLE_HANDS[HOLE_OTHER]] = 1
+
+# FINAL_TOTAL_MAP[j,k] is 1 when a dealer standing on hand j ends with the
+# k-th of DEALER_TOTALS. There are two ways to end with sum X.
+# Either you have sum X or end with sum X-10 and a useable ace.
+FINAL_TOTAL_MAP = np.zeros((N_HANDS,len(DEALER_TOTALS)))
+for k,total in enumerate(DEALER_TOTALS[:-1]):
+  FINAL_TOTAL_MAP[[HAND_IDS[f"{total},0"],HAND_IDS[f"{total-10},1"]],k] = 1
+FINAL_TOTAL_MAP[BUST_ID,-1] = 1
+
+# The arrays below all have a leading axis over compositions so that many
+# compositions (a batch) are evaluated at once. A single composition is just
+# a batch of one.
+#
+# Hitting is never stored as a dense (34, 34) matrix in the analysis. A hand
+# has only 10 possible next hands, one per card value, given by NEXT_HAND.
+# So the expected value of hitting a hand is the probability weighted sum of
+# the values of its 10 next hands, gathered through NEXT_HAND, i.e.
+#   sum_j tm[i,j] E[j] = sum_c probs[c] E[NEXT_HAND[i,c]]
+# The work is proportional to the number of card values rather than the
+# number of hands squared.
+
+def hit_transition_matrix(probs):
+  """
+  Returns the stochastic matrices of going from a hand to the next hand after
+  hitting. Only used for exporting, see above.
+
+  Args:
+      probs (np.ndarray): The probabilities of the 10 card values Ace,2,...,9,Face card,
+          of shape (N, 10).
+
+  Returns:
+      np.ndarray: Of shape (N, 34, 34).
+  """
+  return np.einsum('bc,icj->bij',probs,HIT_INDICATOR)
+
+def dealer_stands(hit_soft_17=False):
+  # Whether the dealer stands on each hand. Dealers must stand if their score
+  # is above or equal to 17, except on a soft 17 if they hit soft 17s.
+  stands = SCORES>=17
+  if hit_soft_17:
+    stands[SOFT_17_ID] = False
+  return stands
+
+def _dealer_levels(hit_soft_17):
+  # The hands the dealer hits, grouped into levels such that every hand a
+  # hand can be hit to is either one the dealer stands on or in an earlier level.
+  # Since sums only go up, the hands with the highest sums come first.
+  stands = dealer_stands(hit_soft_17)
+  done = set(np.flatnonzero(stands))
+  remaining = [i for i in SORTED_IDS if not stands[i]]
+  levels = []
+  while remaining:
+    level = [i for i in remaining if all(j in done for j in NEXT_HAND[i])]
+    levels.append(np.array(level))
+    done.update(level)
+    remaining = [i for i in remaining if i not in done]
+  return levels
+
+DEALER_LEVELS = {hit_soft_17:_dealer_levels(hit_soft_17) for hit_soft_17 in (False,True)}
+
+def dealer_absorption(probs,hit_soft_17=False):
+  """
+  Returns the probabilities of the dealer's *final* hand from each hand after
+  following how dealers must hit/stand, of shape (N, 34, number of final
+  hands), along with the ids of the final hands (those the dealer stands on).
+  If hit_soft_17, the dealer hits a soft 17.
+
+  The dealer's play is an absorbing Markov chain: the hands the dealer stands
+  on are absorbing and the others are transient. With Q the transitions among
+  transient hands and R those from transient to absorbing hands, the final
+  hands are B = (I-Q)^-1 R, i.e. the solution of (I-Q)B = R. Ordered by sum
+  Q is strictly triangular, so this is solved by block substitution over
+  DEALER_LEVELS, one batched gather per level (12 for S17).
+  """
+  stands = dealer_stands(hit_soft_17)
+  absorbing = np.flatnonzero(stands)
+  B = np.zeros((len(probs),N_HANDS,len(absorbing)),dtype=np.result_type(probs,float))
+  B[:,absorbing,np.arange(len(absorbing))] = 1
+  for level in DEALER_LEVELS[hit_soft_17]:
+    # B_i = sum_c probs[c] B_NEXT_HAND[i,c], where every B_NEXT_HAND[i,c] is final
+    B[:,level] = np.einsum('bc,blck->blk',probs,B[:,NEXT_HAND[level]])
+  return B, absorbing
+
+def dealer_end_matrix(probs,hit_soft_17=False):
+  """
+  Returns the stochastic matrices of going from a hand to the *final* hand after
+  following how dealers must hit/stand, of shape (N, 34, 34). Only used for
+  exporting, see dealer_absorption.
+  """
+  B, absorbing = dealer_absorption(probs,hit_soft_17)
+  end_tm = np.zeros(B.shape[:2]+(N_HANDS,),dtype=B.dtype)
+  end_tm[:,:,absorbing] = B
+  return end_tm
+
+def dealer_end_matrix_loop(tm,hit_soft_17=False):
+  """
+  The same as dealer_end_matrix computed hand by hand. Kept as the reference
+  dealer_end_matrix is checked against (see check_dealer_end_matrix).
+  """
+  end_tm = np.zeros_like(tm)
+  stands = dealer_stands(hit_soft_17)
+  # Recursion over,
+  # P(XT = xT|X0=x0) = Sum over x1>x0 and x1 reachable from x0
+  # of P(XT=xT|X1=x1)P(X1=x1|X0=x0)
+  for i in SORTED_IDS:
+    if stands[i]:
+      end_tm[:,i,i] = 1
+    else:
+      end_tm[:,i] = np.einsum('bj,bjk->bk',tm[:,i],end_tm)
+  return end_tm
+
+def check_dealer_end_matrix(n=1000,seed=0):
+  # Returns the largest difference between dealer_end_matrix and
+  # dealer_end_matrix_loop over n random compositions and both dealer rules.
+  probs = np.random.default_rng(seed).dirichlet(np.ones(10),n)
+  tm = hit_transition_matrix(probs)
+  return max(np.abs(dealer_end_matrix(probs,h)-dealer_end_matrix_loop(tm,h)).max() for h in (False,True))
+
+def dealer_final_probs(end_tm):
+  """
+  Returns the probabilities of the dealer's final totals 17,...,21,22 (bust)
+  from each of the 10 possible starting hands, of shape (N, 10, 6).
+  """
+  return end_tm[:,SINGLE_IDS]@FINAL_TOTAL_MAP
+
+def dealer_natural_probs(probs):
+  """
+  Returns the probability of a natural 21 for each of the dealer's starting hands,
+  of shape (N, 10).
+  """
+  natural = np.zeros_like(probs)
+  natural[:,0] = probs[:,9]
+  natural[:,9] = probs[:,0]
+  return natural
+
+def dealer_final_probs_nn(ps,natural):
+  """
+  Returns the probabilities of the dealer's final totals given the dealer doesn't
+  have a natural. P(A|B)=P(A and B)/P(B) where B is "non-natural 21".
+  """
+  ps_nn = ps.copy()
+  ps_nn[...,4] -= natural
+  return ps_nn/(1-natural)[...,None]
+
+# The expected values below are computed for the first and, if needed, second
+# moments of the net result X together in one pass. They're stacked on an axis
+# after the batch axis: [:,0] is E(X) and [:,1] is E(X**2). Since an outcome
+# worth v contributes v**k to the k-th moment, the moments of a fixed outcome
+# are given by moment_values.
+
+def moment_values(v,moments):
+  # v**k for k=1,...,moments, shaped to broadcast over the trailing (hand, dealer) axes
+  return (v**np.arange(1,moments+1,dtype=float))[:,None,None]
+
+def expected_hold(ps_nn,cs_nn,moments=2):
+  """
+  Returns the moments of the value of holding for every hand of the player
+  and every hand showing for the dealer, of shape (N, moments, 34, 10).
+  Winning has value +1, drawing has value 0, and losing has value -1.
+
+  Args:
+      ps_nn (np.ndarray): The probabilities of the dealer's final totals
+          given no natural, of shape (N, 10, 6).
+      cs_nn (np.ndarray): The cumulative sums of ps_nn.
+      moments (int): 1 for only E(X), 2 for E(X) and E(X**2).
+  """
+  p_dealer_bust = ps_nn[:,None,:,5]
+  scores = SCORES[:,None]
+  # P(dealer terminal score <= score - 1), only possible to beat without a
+  # dealer bust if you score 18 or more
+  p_player_more = np.where(scores>=18,cs_nn[...,np.clip(SCORES-18,0,5)].swapaxes(1,2),0)
+  # if you score less than 17, then a dealer beats you as long as they don't bust,
+  # otherwise the dealer wins with 1-P(dealer terminal score <= score)-P(dealer busts)
+  p_dealer_more = np.where(scores<=16,1-p_dealer_bust,
+                           1-p_dealer_bust-cs_nn[...,np.clip(SCORES-17,0,5)].swapaxes(1,2))
+  lose = moment_values(-1,moments)
+  E1 = (p_dealer_bust+p_player_more)[:,None]+lose*p_dealer_more[:,None]
+  # if you bust, then you lose right away, -1
+  return np.where(scores>21,lose,E1)
+
+def expected_hit(probs,E_hold):
+  """
+  Returns the moments of hitting exactly once and then holding.
+  """
+  return np.einsum('bc,bmicd->bmid',probs,E_hold[:,:,NEXT_HAND])
+
+def expected_M(probs,hit,E_hold):
+  """
+  Returns the moments of following a hit/stand strategy and the strategy.
+
+  If hit is None the optimal strategy is found by backward induction in the
+  same pass: hands are visited in decreasing order of sum, so when a hand is
+  reached every hand it can be hit to already has its optimal value, and
+  hitting is chosen when hitting and then playing on optimally is at least as
+  good as holding. Otherwise hit is the strategy to follow, of shape (34, 10)
+  or (N, 34, 10).
+
+  Returns:
+      tuple: The moments of shape (N, moments, 34, 10) and the hit matrix.
+  """
+  E1 = np.zeros_like(E_hold)
+  optimal = hit is None
+  if optimal:
+    hit = np.ones(E_hold[:,0].shape,dtype=bool)
+  else:
+    hit = np.broadcast_to(hit,E_hold[:,0].shape)
+  # Recursion over,
+  # E(XT = xT|X0=x0) = Sum over x1>x0 and x1 reachable from x0
+  # of E(XT=xT|X1=x1)P(X1=x1|X0=x0)
+  for i in SORTED_IDS:
+    if i==BUST_ID:
+      E1[:,:,i] = moment_values(-1,E_hold.shape[1])[:,0]
+      continue
+    E_next = np.einsum('bc,bmcd->bmd',probs,E1[:,:,NEXT_HAND[i]])
+    if optimal:
+      # >= is used because if hitting is just as good, you may as well hit.
+      # np.isclose is added due to floating point error
+      hit[:,i] = (E_next[:,0]>=E_hold[:,0,i])|np.isclose(E_next[:,0],E_hold[:,0,i],atol=1e-9)
+    E1[:,:,i] = np.where(hit[:,None,i],E_next,E_hold[:,:,i])
+  return E1, hit
+
+def expected_split(probs,E_hold,E_nd):
+  """
+  Returns the moments of splitting each pair, of shape (N, moments, 10, 10).
+
+  Args:
+      E_nd (np.ndarray): The moments of each hand after splitting, i.e.
+          when following the double down and hit/stand strategy, or just the
+          hit/stand strategy if doubling after splitting isn't allowed.
+  """
+  # The hands after drawing a card to each half of a pair
+  after = NEXT_HAND[SPLIT_IDS]
+  # when splitting aces you can only hit once and hold
+  aces = (PAIR_IDS==HAND_IDS['2,1'])[:,None,None]
+  E_after = np.where(aces,E_hold[:,:,after],E_nd[:,:,after])
+  E1 = 2*np.einsum('bc,bmpcd->bmpd',probs,E_after)
+  if E1.shape[1]>1:
+    # E(X**2) isn't just multiplied by 4 because it's not E((2X)**2) but E((X+Y)**2)
+    # Where X and Y are iid. E((X+Y)**2)=E(X**2+2XY+Y**2)
+    # = 2E(X**2)+4E(X)
+    E1[:,1] += 2*E1[:,0]
+  return E1
+
+def hole_probs(probs):
+  """
+  Returns the probability of a natural, the probability of each pair, and the
+  remaining probability of every other hand in the first two cards.
+  """
+  P = probs[:,:,None]*probs[:,None,:]
+  natural_prob = P[:,HOLE_NATURAL].sum(axis=-1)
+  hole_pair_probs = np.diagonal(P,axis1=1,axis2=2).copy()
+  hole_hand_probs = P.reshape(len(P),100)@HOLE_HAND_MAP
+  return natural_prob,hole_pair_probs,hole_hand_probs
+
+def expected_dealer(natural_prob,hole_pair_probs,hole_hand_probs,natural,
+                    E_split,E_nosplit,E_nd,split,payout=1.5,
+                    surrender=None,surrender_pair=None):
+  """
+  Returns the moments for each specific hand shown by the dealer, of
+  shape (N, moments, 10).
+
+  Args:
+      payout (float): What a player's natural pays.
+      surrender, surrender_pair (np.ndarray): Where the player surrenders
+          (for half the bet) instead of playing a hand or a pair, if given.
+  """
+  moments = E_nd.shape[1]
+  E_natural = moment_values(payout,moments)[:,0,0]*natural_prob[:,None]
+  E_pairs = np.where(split[:,None],E_split,E_nosplit)
+  if surrender is not None:
+    E_surrender = moment_values(-0.5,moments)
+    E_pairs = np.where(surrender_pair[:,None],E_surrender,E_pairs)
+    E_nd = np.where(surrender[:,None],E_surrender,E_nd)
+  E_dealer_nn = (np.einsum('bp,bmpd->bmd',hole_pair_probs,E_pairs)+
+                 np.einsum('bj,bmjd->bmd',hole_hand_probs,E_nd)+
+                 E_natural[:,:,None])
+  E_dealer_n = moment_values(-1,moments)[:,0,0]*(1-natural_prob)[:,None]
+  return natural[:,None]*E_dealer_n[:,:,None]+(1-natural[:,None])*E_dealer_nn
+
+# The dealer's final total distributions are memoized process wide, keyed on
+# the composition (its exact bytes) and whether the dealer hits a soft 17, so
+# every analysis, EOR run and sweep in a process shares them. The least
+# recently used entries are evicted beyond DEALER_CACHE_SIZE compositions.
+DEALER_CACHE_SIZE = 2**14
+_dealer_cache = OrderedDict()
+_dealer_cache_stats = {'hits':0,'misses':0}
+
+def _dealer_distributions(probs,hit_soft_17):
+  B, absorbing = dealer_absorption(probs,hit_soft_17)
+  ps = B[:,SINGLE_IDS]@FINAL_TOTAL_MAP[absorbing]
+  natural = dealer_natural_probs(probs)
+  return {'dealer_ps':ps,'natural':natural,'dealer_ps_nn':dealer_final_probs_nn(ps,natural)}
+
+def dealer_distributions(probs,hit_soft_17=False):
+  """
+  Returns the dealer's final total distributions for a batch of compositions,
+  looking each up in the process wide cache and only computing the missing ones.
+
+  Args:
+      probs (np.ndarray): The probabilities of the 10 card values, of shape (N, 10).
+      hit_soft_17 (bool): Whether the dealer hits a soft 17.
+
+  Returns:
+      dict: 'dealer_ps' (N, 10, 6), the final totals from each starting hand,
+      'natural' (N, 10), the probability of a natural, and 'dealer_ps_nn'
+      (N, 10, 6), the final totals given no natural.
+  """
+  probs = np.atleast_2d(probs)
+  if np.iscomplexobj(probs):
+    # Complex step perturbations are never looked up again, so aren't cached
+    return _dealer_distributions(probs,hit_soft_17)
+
+  # Each distinct composition is looked up (and solved) once, however many
+  # rows of the batch share it
+  unique, inverse = np.unique(np.asarray(probs,dtype=float),axis=0,return_inverse=True)
+  inverse = inverse.reshape(-1)
+  keys = [(row.tobytes(),bool(hit_soft_17)) for row in unique]
+  entries = [_dealer_cache.get(key) for key in keys]
+  missing = [j for j,entry in enumerate(entries) if entry is None]
+  for key,entry in zip(keys,entries):
+    if entry is not None:
+      _dealer_cache.move_to_end(key)
+  rows = np.bincount(inverse,minlength=len(unique))
+  _dealer_cache_stats['misses'] += len(missing)
+  _dealer_cache_stats['hits'] += int(len(inverse)-rows[missing].sum())
+
+  if missing:
+    d = _dealer_distributions(unique[missing],hit_soft_17)
+    for i,j in enumerate(missing):
+      # copies so the cache doesn't keep the whole batch alive
+      entries[j] = _dealer_cache[keys[j]] = {k:v[i].copy() for k,v in d.items()}
+    while len(_dealer_cache)>DEALER_CACHE_SIZE:
+      _dealer_cache.popitem(last=False)
+  return {k:np.stack([entry[k] for entry in entries])[inverse] for k in ['dealer_ps','natural','dealer_ps_nn']}
+
+def dealer_cache_info():
+  return dict(_dealer_cache_stats,size=len(_dealer_cache),maxsize=DEALER_CACHE_SIZE)
+
+def clear_dealer_cache():
+  _dealer_cache.clear()
+  _dealer_cache_stats.update(hits=0,misses=0)
+
+def _store_moments(r,name,X):
+  # Stores stacked moments under 'X_'+name and each moment under the names of
+  # the BlackjackAnalysis attributes, 'E_'+name and 'EX2_'+name.
+  r['X_'+name] = X
+  r['E_'+name] = X[:,0]
+  if X.shape[1]>1:
+    r['EX2_'+name] = X[:,1]
+
+def dealer_stage(probs,hit_soft_17=False,dense=False,moments=2):
+  """
+  Runs the stages of the analysis which only depend on the composition and the
+  dealer's rules: the dealer's final totals and the expected values of
+  holding and of hitting once. They're shared by every rule set with the
+  same Rules.dealer_key.
+
+  Args:
+      probs (np.ndarray): The probabilities of the 10 card values, of shape (N, 10).
+      hit_soft_17 (bool): Whether the dealer hits a soft 17.
+      dense (bool): Whether to include the dense hit_transition_matrix and
+          dealer_end_tm, which are only kept for exporting.
+      moments (int): 2 to carry E(X**2) for the variance along with E(X), 1
+          for only E(X).
+  """
+  r = {}
+  if dense:
+    r['hit_transition_matrix'] = hit_transition_matrix(probs)
+    r['dealer_end_tm'] = dealer_end_matrix(probs,hit_soft_17)
+  r.update(dealer_distributions(probs,hit_soft_17))
+  ps_nn = r['dealer_ps_nn']
+  r['dealer_cs_nn'] = cs_nn = np.cumsum(ps_nn,axis=-1)
+
+  # The identity Var(X)=E(X**2)-(E(X))**2 is used for the variance.
+  _store_moments(r,'hold',expected_hold(ps_nn,cs_nn,moments))
+  _store_moments(r,'hit',expected_hit(probs,r['X_hold']))
+  return r
+
+def hit_stage(probs,d,hit=None):
+  """
+  Returns the hit/stand strategy (the optimal one unless hit is given) and the
+  expected values of following it, given the results d of dealer_stage. Like
+  the dealer stage, these don't depend on the player's doubling, splitting,
+  surrender or payout rules.
+  """
+  r = {}
+  X_M, r['hit_matrix'] = expected_M(probs,hit,d['X_hold'])
+  _store_moments(r,'M',X_M)
+  return r
+
+def rules_stage(probs,d,rules,dd=None,split=None):
+  """
+  Runs the rest of the analysis for one set of rules, given the results d of
+  dealer_stage and hit_stage for the same dealer rules, carrying the same
+  moments.
+
+  If rules allow surrender, surrendering is always decided optimally, even
+  when the other matrices are fixed.
+  """
+  X_hold, X_M, natural = d['X_hold'], d['X_M'], d['natural']
+  moments = X_hold.shape[1]
+  r = {}
+  # Doubling down doubles the bet, so the k-th moment is 2**k times that of hitting once
+  _store_moments(r,'dd',moment_values(2,moments)*d['X_hit'])
+  E_dd, E_M = r['E_dd'], d['E_M']
+  can_double = rules.can_double(SCORES)[:,None]
+  if dd is None:
+    dd = E_dd>E_M
+  r['dd_matrix'] = dd = np.broadcast_to(dd&can_double,E_M.shape)
+  X_nd = np.where(dd[:,None],r['X_dd'],X_M)
+  X_after_split = X_nd if rules.double_after_split else X_M
+  _store_moments(r,'split',expected_split(probs,X_hold,X_after_split))
+  _store_moments(r,'nosplit',X_nd[:,:,PAIR_IDS])
+  E_split, E_nosplit, E_nd = r['E_split'], r['E_nosplit'], X_nd[:,0]
+  if split is None:
+    split = E_split>E_nosplit
+  r['split_matrix'] = split = np.broadcast_to(split,E_split.shape)
+
+  # Surrendering is only better than playing on if playing on loses more than half the bet
+  if rules.surrender:
+    surrender = np.real(E_nd)<-0.5
+    surrender_pair = np.real(np.where(split,E_split,E_nosplit))<-0.5
+  else:
+    surrender = np.zeros(E_nd.shape,dtype=bool)
+    surrender_pair = np.zeros(E_split.shape,dtype=bool)
+  r['surrender_matrix'] = surrender
+  r['surrender_pair_matrix'] = surrender_pair
+
+  natural_prob,hole_pair_probs,hole_hand_probs = hole_probs(probs)
+  r['natural_prob'] = natural_prob
+  r['hole_pair_probs'] = hole_pair_probs
+  r['hole_hand_probs'] = hole_hand_probs
+
+  r['X_D'] = X_D = expected_dealer(natural_prob,hole_pair_probs,hole_hand_probs,natural,
+                                   r['X_split'],r['X_nosplit'],X_nd,split,
+                                   payout=rules.blackjack_payout,
+                                   surrender=surrender,surrender_pair=surrender_pair)
+  X = np.einsum('bmd,bd->bm',X_D,probs)
+  r['EVD'] = X_D[:,0]
+  r['EV'] = X[:,0]
+  if moments>1:
+    r['EX2D'] = X_D[:,1]
+    r['V'] = X[:,1]-r['EV']**2
+  return r
+
+def solve_stages(probs,hit=None,dd=None,split=None,rules=None,dense=True,variance=True):
+  """
+  Runs the full analysis for a batch of compositions.
+
+  Args:
+      probs (np.ndarray): The probabilities of the 10 card values Ace,2,...,9,Face card,
+          of shape (N, 10).
+      hit, dd, split (np.ndarray): Boolean strategy matrices to evaluate, either
+          shared by all compositions or one per composition. If None, the
+          strategy is computed.
+      rules (Rules, optional): The table rules. Defaults to Rules().
+      dense (bool): Whether to include the dense hit_transition_matrix and
+          dealer_end_tm, which are only kept for exporting.
+      variance (bool): Whether to compute the second moments and V. They're
+          carried through the same pass as the expected values.
+
+  Returns:
+      dict: Every intermediate array of the analysis keyed by the names of
+      the corresponding BlackjackAnalysis attributes, each with a leading axis
+      over compositions. The 'X_' arrays are the stacked moments.
+  """
+  if rules is None:
+    rules = Rules()
+  r = dealer_stage(probs,rules.hit_soft_17,dense=dense,moments=2 if variance else 1)
+  r.update(hit_stage(probs,r,hit))
+  r.update(rules_stage(probs,r,rules,dd,split))
+  return r
+
+# The actions of optimal_policy. The first four are those of modules.Strategy.
+ACTIONS = ['stand','hit','double','split','surrender']
+
+def optimal_policy(probs,rules=None):
+  """
+  Returns the optimal action and its expected value for every starting hand
+  and dealer upcard, given the dealer doesn't have a natural.
+
+  Hitting is decided by backward induction over the hands (see expected_M),
+  and doubling down, splitting and surrendering by comparing their values
+  with those of playing on.
+
+  Args:
+      probs (np.ndarray): The probabilities of the 10 card values, of shape (10,) or (N, 10).
+      rules (Rules, optional): The table rules. Defaults to Rules().
+
+  Returns:
+      dict: 'actions' (N, 34, 10), indices into ACTIONS for hands which aren't
+      pairs, and 'values' their expected values. 'pair_actions' and
+      'pair_values' (N, 10, 10) are the same for pairs.
+  """
+  probs = np.asarray(probs,dtype=float)
+  r = solve_stages(np.atleast_2d(probs),rules=rules,dense=False,variance=False)
+  hit, dd, split = r['hit_matrix'], r['dd_matrix'], r['split_matrix']
+  surrender, surrender_pair = r['surrender_matrix'], r['surrender_pair_matrix']
+
+  actions = np.select([surrender,dd,hit],[4,2,1],0)
+  values = np.where(surrender,-0.5,np.where(dd,r['E_dd'],r['E_M']))
+  pair_actions = np.select([surrender_pair,split],[4,3],np.where(dd,2,hit.astype(int))[:,PAIR_IDS])
+  pair_values = np.where(surrender_pair,-0.5,np.where(split,r['E_split'],r['E_nosplit']))
+  out = {'actions':actions,'values':values,'pair_actions':pair_actions,'pair_values':pair_values}
+  if probs.ndim==1:
+    out = {k:v[0] for k,v in out.items()}
+  return out
+
+def solve(probs,hit=None,dd=None,split=None,rules=None,variance=True):
+  """
+  Runs the full analysis for one composition.
+
+  Args:
+      probs (np.ndarray): The probabilities of the 10 card values Ace,2,...,9,Face card.
+      hit, dd, split (np.ndarray): Boolean strategy matrices to evaluate. If
+          None, the strategy is computed.
+      rules (Rules, optional): The table rules. Defaults to Rules().
+      variance (bool): Whether to compute the second moments and V.
+
+  Returns:
+      dict: Every intermediate array of the analysis keyed by the names of
+      the corresponding BlackjackAnalysis attributes.
+  """
+  probs = np.asarray(probs,dtype=float)[None]
+  return {k:v[0] for k,v in solve_stages(probs,hit,dd,split,rules,variance=variance).items()}
+
+# The outputs kept by solve_batch. The other intermediates are dropped after
+# each chunk to keep memory bounded. EX2D and V are only there with the variance.
+BATCH_OUTPUTS = ['hit_matrix','dd_matrix','split_matrix','surrender_matrix',
+                 'surrender_pair_matrix','EVD','EV','EX2D','V']
+
+# A rough count of the bytes solve_stages uses per composition, dominated by
+# the gathered (2, 34, 10, 10) next hand values and the (2, 10, 10, 10) split
+# intermediates.
+BYTES_PER_COMPOSITION = 8*(2*N_HANDS*10*10+4*10*10*10+40*N_HANDS*10)
+
+def _per_chunk(x,lo,hi):
+  # strategies shared by every composition are passed through unchanged
+  if x is None or np.ndim(x)==2:
+    return x
+  return x[lo:hi]
+
+def solve_batch(probs,hit=None,dd=None,split=None,max_bytes=2**28,rules=None,variance=True):
+  """
+  Runs the full analysis for many compositions at once.
+
+  Args:
+      probs (np.ndarray): The probabilities of the 10 card values, of shape (N, 10).
+      hit, dd, split (np.ndarray): Boolean strategy matrices to evaluate, of shape
+          (34, 10)/(10, 10) to share one strategy or (N, 34, 10)/(N, 10, 10) for
+          one per composition. If None, the strategy of each composition is computed.
+      max_bytes (int): The memory budget. The batch is split into chunks that
+          fit within it.
+      rules (Rules, optional): The table rules. Defaults to Rules().
+      variance (bool): Whether to compute V. Without it, solving takes
+          about half as long.
+
+  Returns:
+      dict: The arrays named in BATCH_OUTPUTS, each with a leading axis of length N.
+  """
+  probs = np.atleast_2d(np.asarray(probs,dtype=float))
+  n = len(probs)
+  chunk = max(1,max_bytes//BYTES_PER_COMPOSITION)
+
+  r = {}
+  for lo in range(0,n,chunk):
+    hi = min(n,lo+chunk)
+    ri = solve_stages(probs[lo:hi],_per_chunk(hit,lo,hi),_per_chunk(dd,lo,hi),
+                      _per_chunk(split,lo,hi),rules,dense=False,variance=variance)
+    for key in BATCH_OUTPUTS:
+      if key not in ri:
+        continue
+      if key not in r:
+        r[key] = np.empty((n,)+ri[key].shape[1:],dtype=ri[key].dtype)
+      r[key][lo:hi] = ri[key]
+  return r
+
+def sweep(probs,rules_list,hit=None,dd=None,split=None,max_bytes=2**28,variance=True):
+  """
+  Runs the full analysis for every combination of a set of rules and a composition.
+
+  Intermediates which a rule doesn't affect are computed once and shared: the
+  dealer's final totals and the hit/stand results by every rule set with the
+  same Rules.dealer_key. Only
+  rules_stage is run per rule set.
+
+  Args:
+      probs (np.ndarray): The probabilities of the 10 card values, of shape (N, 10).
+      rules_list (list): The Rules to evaluate.
+      hit, dd, split (np.ndarray): Boolean strategy matrices to evaluate, as for
+          solve_batch. If None, the strategy for each rule set is computed.
+      max_bytes (int): The memory budget per rule set, as for solve_batch.
+      variance (bool): Whether to compute V, as for solve_batch.
+
+  Returns:
+      dict: The arrays named in BATCH_OUTPUTS, each with leading axes of
+      length len(rules_list) and N.
+  """
+  probs = np.atleast_2d(np.asarray(probs,dtype=float))
+  n = len(probs)
+  chunk = max(1,max_bytes//BYTES_PER_COMPOSITION)
+  dealer_keys = {rules.dealer_key() for rules in rules_list}
+
+  r = {}
+  for lo in range(0,n,chunk):
+    hi = min(n,lo+chunk)
+    shared = {}
+    for key in dealer_keys:
+      shared[key] = dealer_stage(probs[lo:hi],key,moments=2 if variance else 1)
+      shared[key].update(hit_stage(probs[lo:hi],shared[key],_per_chunk(hit,lo,hi)))
+    for i,rules in enumerate(rules_list):
+      d = shared[rules.dealer_key()]
+      ri = rules_stage(probs[lo:hi],d,rules,_per_chunk(dd,lo,hi),_per_chunk(split,lo,hi))
+      ri['hit_matrix'] = d['hit_matrix']
+      for key in BATCH_OUTPUTS:
+        if key not in ri:
+          continue
+        if key not in r:
+          r[key] = np.empty((len(rules_list),n)+ri[key].shape[1:],dtype=ri[key].dtype)
+        r[key][i,lo:hi] = ri[key]
+  return r
+
+# The step used for complex step differentiation. Since f(p+ih) = f(p)+ihf'(p)+O(h**2)
+# the derivative is Im(f(p+ih))/h without any cancellation error, so h can be tiny.
+COMPLEX_STEP = 1e-30
+
+def solve_gradient(probs,hit,dd,split,rules=None):
+  """
+  Computes EV and V together with their gradients with respect to the 10 card
+  probabilities, holding the strategy fixed.
+
+  Every stage of the analysis is a smooth function of the card probabilities
+  once the strategy is fixed, so the derivatives are exact (to floating point)
+  and come from one batched pass over the 10 perturbed compositions.
+
+  Args:
+      probs (np.ndarray): The probabilities of the 10 card values, of shape (10,) or (N, 10).
+      hit, dd, split (np.ndarray): The boolean strategy matrices to hold fixed.
+      rules (Rules, optional): The table rules. Defaults to Rules().
+
+  Returns:
+      dict: 'EV' and 'V', and 'EV_grad' and 'V_grad' with a trailing axis of
+      length 10 for the derivative with respect to each card probability.
+  """
+  probs = np.asarray(probs,dtype=float)
+  batch = np.atleast_2d(probs)
+  n = len(batch)
+  perturbed = batch[:,None,:]+1j*COMPLEX_STEP*np.eye(10)
+  strategy = [x if np.ndim(x)==2 else np.repeat(x,10,axis=0) for x in (hit,dd,split)]
+  r = solve_stages(perturbed.reshape(10*n,10),*strategy,rules,dense=False)
+  out = {}
+  for key in ['EV','V']:
+    x = r[key].reshape(n,10)
+    # The real part of every perturbed solve is the unperturbed value
+    out[key] = x[:,0].real
+    out[key+'_grad'] = x.imag/COMPLEX_STEP
+  if probs.ndim==1:
+    out = {k:v[0] for k,v in out.items()}
+  return out
+
+if __name__ == '__main__':
+  # python -m modules.engine
+  print(f"Largest difference of dealer_end_matrix from the loop: {check_dealer_end_matrix():.3g}")
@@ -0,0 +1,36 @@
+from modules.Hand import Hand
+import numpy as np
+
+# Every hand (simple_score, useable ace) is given an integer id equal to its
+# position in Hand.generate_simple_hands(). These tables are all a strategy
+# table needs (see modules.Strategy), so they're kept apart from the rest of
+# modules.engine, which builds its tables of hitting and the dealer on import.
+
+STR_HANDS = [hand.simple_hand_str() for hand in Hand.generate_simple_hands()]
+HAND_IDS = {str_hand:i for i,str_hand in enumerate(STR_HANDS)}
+N_HANDS = len(STR_HANDS)
+
+SUMS = np.array([int(s.split(',')[0]) for s in STR_HANDS])
+ACES = np.array([int(s.split(',')[1]) for s in STR_HANDS])
+# score counting a useable ace as 11
+SCORES = SUMS+10*ACES
+
+# hand ids in the order used for dynamic programming (descending by sum)
+SORTED_IDS = np.array([HAND_IDS[s] for s in Hand.get_sorted_simple_hands_str()])
+
+# ids of the dealer's possible starting hands (columns of most matrices)
+SINGLE_STR_HANDS = Hand.get_single_card_simple_hands_str()
+SINGLE_IDS = np.array([HAND_IDS[s] for s in SINGLE_STR_HANDS])
+
+# ids of the possible pairs, and of the hand left after splitting each pair
+PAIR_STR_HANDS = Hand.get_pair_simple_hands_str()
+PAIR_IDS = np.array([HAND_IDS[s] for s in PAIR_STR_HANDS])
+SPLIT_IDS = np.array([HAND_IDS[f"{SUMS[i]//2},{ACES[i]}"] for i in PAIR_IDS])
+
+BUST_ID = HAND_IDS['22,0']
+# A soft 17, which the dealer hits under the H17 rule
+SOFT_17_ID = HAND_IDS['7,1']
+
+# HAND_ID_TABLE[simple_score, useable ace] is the id of the hand, -1 if there's none.
+HAND_ID_TABLE = np.full((23,2),-1)
+HAND_ID_TABLE[SUMS,ACES] = np.arange(N_HANDS)
@@ -0,0 +1,6 @@
+# Part of the key of every cached result (see modules.cache). It must be
+# increased whenever a change to modules.engine (or anything else computing a
+# cached result) changes any result, so results of an older version are never
+# reused. It's kept here, apart from the engine, so loading cached results
+# doesn't import the engine.
+VERSION = 3
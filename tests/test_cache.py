@@ -0,0 +1,61 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def run(code,cache_dir):
+  env = dict(os.environ,BLACKJACK_CACHE_DIR=str(cache_dir))
+  return subprocess.run([sys.executable,'-c',code],cwd=ROOT,env=env,
+                        capture_output=True,text=True,check=True).stdout
+
+def test_warm_cache_doesnt_import_engine(tmp_path):
+  # A fresh interpreter, since the tests may already have imported the engine
+  load = ("import sys\n"
+          "import BasicStrategyTrainer, CardCountingTrainer\n"
+          "from modules import cache\n"
+          "cache.strategy_table()\n"
+          "cache.count_tags()\n"
+          "print('modules.engine' in sys.modules)\n")
+  run(load,tmp_path)
+  assert run(load,tmp_path).strip()=='False'
+
+def test_EORs_remove_cards_from_card_probs(tmp_path):
+  from ComputeEffectOfRemoval import gradient_EOR_table
+  from modules import cache
+  import numpy as np
+  previous = cache.cache_dir()
+  cache.set_cache_dir(str(tmp_path))
+  try:
+    # A ten rich shoe
+    card_probs = np.array([4]*9+[18])/54
+    EOR = cache.EORs(6,card_probs=card_probs,processes=1)['EOR']
+    a = cache.analysis(card_probs)
+    strategy = (a['hit_matrix'],a['dd_matrix'],a['split_matrix'])
+    estimate = gradient_EOR_table([6],strategy=strategy,card_probs=card_probs).to_numpy()[:,0]
+    assert np.allclose(EOR,estimate,atol=2e-5)
+    assert not np.allclose(EOR,cache.EORs(6,processes=1)['EOR'],atol=2e-5)
+  finally:
+    cache.set_cache_dir(previous)
+
+def test_EORs_default_to_the_strategy_of_card_probs(tmp_path):
+  from ComputeEffectOfRemoval import compute_EOR_table, gradient_EOR_table
+  from modules import cache
+  import numpy as np
+  previous = cache.cache_dir()
+  cache.set_cache_dir(str(tmp_path))
+  try:
+    # A shoe short of fives and rich in tens plays differently from a single deck
+    card_probs = np.array([4,4,4,4,1,4,4,4,4,19])/52
+    a = cache.analysis(card_probs)
+    b = cache.analysis()
+    assert not np.array_equal(a['hit_matrix'],b['hit_matrix']) or not np.array_equal(a['dd_matrix'],b['dd_matrix'])
+    strategy = (a['hit_matrix'],a['dd_matrix'],a['split_matrix'])
+    for table in [compute_EOR_table,gradient_EOR_table]:
+      kwargs = {'processes':1} if table is compute_EOR_table else {}
+      default = table([6],card_probs=card_probs,**kwargs).to_numpy()
+      assert np.allclose(default,table([6],strategy=strategy,card_probs=card_probs,**kwargs).to_numpy())
+      single_deck = (b['hit_matrix'],b['dd_matrix'],b['split_matrix'])
+      assert not np.allclose(default,table([6],strategy=single_deck,card_probs=card_probs,**kwargs).to_numpy())
+  finally:
+    cache.set_cache_dir(previous)
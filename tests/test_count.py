@@ -0,0 +1,38 @@
+from modules.Count import RunningCounts, COUNT_SYSTEMS
+from modules.Deck import Deck
+from modules.Shoe import Shoe
+import numpy as np
+
+def test_count_carries_across_shuffles():
+  shoe = Shoe(1,seed=0)
+  carried = RunningCounts({'Hi-Lo':COUNT_SYSTEMS['Hi-Lo']},shoe)
+  reset = RunningCounts({'Hi-Lo':COUNT_SYSTEMS['Hi-Lo']},shoe,reset_on_shuffle=True)
+  cards = shoe.draw_cards(10)
+  count = sum(COUNT_SYSTEMS['Hi-Lo'][card.value-1] for card in cards)
+  shoe.reshuffle_deck()
+  assert carried['Hi-Lo']==count
+  assert reset['Hi-Lo']==0
+
+def test_deck_shares_one_read_only_array():
+  deck = Deck(seed=0)
+  received = []
+  for _ in range(3):
+    deck.subscribe(received.append,batched=True)
+  cards = deck.draw_cards(5)
+  assert received[0] is received[1] is received[2]
+  assert not received[0].flags.writeable
+  assert np.array_equal(received[0],[card.code for card in cards])
+
+def test_trainer_count_resets_on_reshuffle(tmp_path):
+  from CardCountingTrainer import CardCountTrainer
+  from modules import cache
+  previous = cache.cache_dir()
+  cache.set_cache_dir(str(tmp_path))
+  try:
+    trainer = CardCountTrainer()
+    while trainer.count==0:
+      trainer.deck.draw_cards(4)
+    trainer.deck.reshuffle_deck()
+    assert trainer.count==0
+  finally:
+    cache.set_cache_dir(previous)
@@ -0,0 +1,42 @@
+from BetSpreadOptimizer import BetSpreadOptimizer
+from CountEvaluation import BetRamp, PlayedShoeSample, summarize
+from modules.Count import COUNT_SYSTEMS
+from modules import cache
+import numpy as np
+import pytest
+
+@pytest.fixture(scope='module',autouse=True)
+def cache_dir(tmp_path_factory):
+  previous = cache.cache_dir()
+  cache.set_cache_dir(str(tmp_path_factory.mktemp('cache')))
+  yield
+  cache.set_cache_dir(previous)
+
+@pytest.fixture(scope='module')
+def sample():
+  return PlayedShoeSample(2000,n_decks=6,penetration=0.75,seed=0)
+
+def test_rounds_are_played_from_the_shoe(sample):
+  # Every round starts where the previous one of its shoe ended, so the cards
+  # dealt before it are its start, and shoes stop at the cut card
+  assert np.array_equal(sample.dealt.sum(axis=-1)[sample.played],sample.starts[sample.played])
+  assert np.all(np.diff(sample.starts,axis=1)[sample.played[:,1:]]>=4)
+  assert np.all(sample.starts[sample.played]<int(0.75*52*6))
+  assert np.all(sample.results[~sample.played]==0)
+  assert 5<sample.cards_per_round<6
+
+def test_count_ramp_beats_flat_betting(sample):
+  true_counts = sample.true_counts(COUNT_SYSTEMS['Hi-Lo'])
+  totals = sample.totals(np.stack([np.ones_like(true_counts),BetRamp()(true_counts)]))
+  assert np.all(totals[3]==sample.played.sum())
+  flat, ramp = summarize(totals)['win_rate']
+  assert abs(flat)<0.02
+  assert ramp>flat
+
+def test_optimizer_bins_the_played_rounds():
+  # One chunk of shoes, so the optimizer's are those of the first seed spawned
+  optimizer = BetSpreadOptimizer(COUNT_SYSTEMS['Hi-Lo'],n_shoes=200,seed=0,chunk=200)
+  sample = PlayedShoeSample(200,seed=np.random.SeedSequence(0).spawn(1)[0])
+  assert optimizer.n.sum()==sample.played.sum()
+  assert np.isclose(optimizer.won.sum(),sample.results.sum())
+  assert optimizer.cards_per_round==sample.cards_per_round
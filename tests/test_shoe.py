@@ -0,0 +1,27 @@
+from modules.Shoe import Shoe
+import numpy as np
+
+def test_reshuffle_between_deal_and_return():
+  shoe = Shoe(2,seed=0)
+  in_play = shoe.draw_cards(4)
+  # Reshuffled mid round, so the cards in play are already back in the shoe
+  shoe.reshuffle_deck()
+  dealt = shoe.draw_cards(10)
+  shoe.add_to_discard(dealt)
+  shoe.add_to_discard(in_play)
+  assert len(shoe)+shoe.n_discarded==52*shoe.n_decks
+  codes = shoe.discarded_codes[:shoe.n_discarded]
+  assert np.array_equal(np.sort(codes),np.sort([card.code for card in dealt]))
+  # The discards are reshuffled back in once the shoe is empty
+  shoe.draw_cards(94)
+  assert len(shoe.draw_cards(10))==10
+  assert len(shoe)==0
+
+def test_exhausted_shoe_doesnt_notify_an_empty_draw():
+  shoe = Shoe(1,seed=0)
+  batches = []
+  shoe.subscribe(lambda codes: batches.append(len(codes)),batched=True)
+  cards = shoe.draw_cards(52)
+  shoe.add_to_discard(cards[:10])
+  shoe.draw_cards(3)
+  assert batches==[52,3]
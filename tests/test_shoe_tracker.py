@@ -0,0 +1,26 @@
+from modules.Shoe import Shoe
+from modules.ShoeTracker import ShoeTracker
+import warnings
+
+def test_drained_shoe():
+  shoe = Shoe(1,seed=0)
+  # Refreshes on the last card too
+  tracker = ShoeTracker(shoe,tags={value:1 for value in range(1,11)},refresh_every=26)
+  with warnings.catch_warnings():
+    warnings.simplefilter('error')
+    shoe.draw_cards(51)
+    assert tracker.EV is not None
+    shoe.draw_cards(1)
+    assert len(shoe)==0
+    assert tracker.EV is None and tracker.V is None and tracker.true_count is None
+    assert tracker.running_count==52
+    assert 'No cards remaining' in tracker.summary()
+
+def test_drained_and_reshuffled():
+  shoe = Shoe(1,seed=0)
+  tracker = ShoeTracker(shoe)
+  full = tracker.EV
+  shoe.draw_cards(52)
+  assert tracker.EV is None
+  shoe.reshuffle_deck()
+  assert abs(tracker.EV-full)<1e-12
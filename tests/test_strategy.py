@@ -0,0 +1,51 @@
+import BlackjackGame as game
+from modules.Card import Card
+from modules.Hand import Hand
+from modules.Strategy import CompiledStrategy
+from modules import cache
+import pytest
+
+@pytest.fixture(scope='module')
+def strategy(tmp_path_factory):
+  # Computed in a temporary cache rather than the repository's
+  previous = cache.cache_dir()
+  cache.set_cache_dir(str(tmp_path_factory.mktemp('cache')))
+  try:
+    return CompiledStrategy.from_cache()
+  finally:
+    cache.set_cache_dir(previous)
+
+def hand(*names,bet=None):
+  h = Hand()
+  h.add_cards([Card(name,'S') for name in names])
+  h.bet = bet
+  return h
+
+def test_three_card_soft_18_doesnt_double(strategy):
+  # Soft 18 against a 6 is doubled down on, otherwise stood on
+  assert strategy.action(hand('A','7'),6) == 'double'
+  three_cards = hand('A','2','5')
+  assert strategy.action(three_cards,6,can_double=False) == 'stand'
+  assert strategy.actions([strategy.hand_id(three_cards)],[6],[False],[False])[0] == 0
+
+def suggestion(strategy,player_hand,chips,monkeypatch,capsys):
+  g = game.BlackjackGame(strategy=strategy)
+  g.player.chips = chips
+  g.player.hands = [player_hand]
+  g.dealer_hand = hand('6','10')
+  options = []
+  monkeypatch.setattr(game,'get_selection',lambda prompt,choices: options.extend(choices) or 'stand')
+  g.handle_action(player_hand)
+  return capsys.readouterr().out, options
+
+def test_game_suggests_without_doubling(strategy,monkeypatch,capsys):
+  out, options = suggestion(strategy,hand('A','2','5',bet=10),100,monkeypatch,capsys)
+  assert 'double down' not in options
+  assert "Basic strategy says to stand." in out
+
+def test_game_suggests_without_chips_to_double(strategy,monkeypatch,capsys):
+  out, options = suggestion(strategy,hand('A','7',bet=10),5,monkeypatch,capsys)
+  assert 'double down' not in options
+  assert "Basic strategy says to stand." in out
+  out, options = suggestion(strategy,hand('A','7',bet=10),100,monkeypatch,capsys)
+  assert "Basic strategy says to double down." in out